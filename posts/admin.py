@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from .models import Comment, Follow, Group, Post
+from .models import Comment, Follow, Group, Post, Task
+from .thumbnails import schedule_thumbnails
 
 
 @admin.register(Post)
@@ -10,6 +12,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.image and 'image' in form.changed_data:
+            schedule_thumbnails(obj)
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -30,3 +37,14 @@ class FollowAdmin(admin.ModelAdmin):
     search_fields = ('user',)
     list_filter = ('user',)
     empty_value_display = '-пусто-'
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'args', 'attempts', 'failed', 'run_after')
+    list_filter = ('failed', 'name')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        queryset.update(failed=False, attempts=0, run_after=timezone.now())
+    retry.short_description = 'Повторить выбранные задачи'
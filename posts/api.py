@@ -0,0 +1,305 @@
+"""JSON API mirroring the pages of ``posts.urls``.
+
+Every list is cursor paginated like the pages and answers
+``{"results": [...], "next_cursor": ..., "previous_cursor": ...}``. Rows
+are read with ``.values()`` of just the columns in ``*_COLUMNS``, and
+``?fields=a,b`` narrows them further, so neither models nor templates
+are built. Responses are gzipped for clients that accept it, and detail
+pages answer conditional GETs like their HTML versions.
+
+Writes take form-encoded or JSON bodies with the fields of ``PostForm``
+and ``CommentForm``. They use the session cookie and CSRF token of the
+site; invalid data gets ``400`` with the form errors and a failed CSRF
+check ``403``, as JSON like every other error (``CSRF_FAILURE_VIEW``).
+"""
+import json
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.csrf import csrf_failure as csrf_failure_page
+from django.views.decorators.gzip import gzip_page
+
+from .conditional import (conditional, group_metadata, post_metadata,
+                          post_page_metadata, profile_metadata)
+from .constants import comments_page_amount, page_amount, trending_amount
+from .feed import FeedPaginator
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post
+from .paginator import CommentPaginator, CursorPaginator
+from .thumbnails import schedule_thumbnails
+from .trending import trending_posts
+from .viewcounts import count_post_view
+
+User = get_user_model()
+
+POST_COLUMNS = {
+    'id': 'id',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'image': 'image',
+    'comment_count': 'comment_count',
+    'view_count': 'view_count',
+}
+COMMENT_COLUMNS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+AUTHOR_COLUMNS = {
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'profile__posts_count',
+    'followers_count': 'profile__followers_count',
+    'following_count': 'profile__following_count',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': message, **details}
+
+
+def api_view(*methods, login=False):
+    """Answer errors as JSON, allow only ``methods`` and gzip responses."""
+    def decorator(view):
+        @gzip_page
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise ApiError(405, 'Method not allowed')
+                if login and not request.user.is_authenticated:
+                    raise ApiError(401, 'Authentication required')
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return JsonResponse(error.body, status=error.status)
+            except Http404:
+                return JsonResponse({'error': 'Not found'}, status=404)
+        return wrapper
+    return decorator
+
+
+def csrf_failure(request, reason=''):
+    """Reject API requests failing the CSRF check with JSON."""
+    match = request.resolver_match
+    if match is None or 'api' not in match.namespaces:
+        return csrf_failure_page(request, reason)
+    error = ApiError(403, 'CSRF verification failed', reason=reason)
+    return JsonResponse(error.body, status=error.status)
+
+
+def selected(request, columns):
+    """Return the ``columns`` named in ``?fields=``, all by default."""
+    names = [
+        name.strip() for name in request.GET.get('fields', '').split(',')
+        if name.strip()]
+    if not names:
+        return columns
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ApiError(400, 'Unknown fields', fields=unknown)
+    return {name: columns[name] for name in names}
+
+
+def values(queryset, columns, *extra):
+    """Return ``queryset.values()`` of ``columns`` and ``extra`` lookups."""
+    return queryset.values(*dict.fromkeys((*columns.values(), *extra)))
+
+
+def serialize(row, columns):
+    data = {name: row[column] for name, column in columns.items()}
+    if 'image' in data:
+        data['image'] = default_storage.url(
+            data['image']) if data['image'] else None
+    return data
+
+
+def page_response(request, paginator, columns, **extra):
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        **extra,
+        'results': [serialize(row, columns) for row in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+def post_list(request, posts):
+    columns = selected(request, POST_COLUMNS)
+    paginator = CursorPaginator(
+        values(posts, columns, 'id', 'pub_date'), page_amount)
+    return page_response(request, paginator, columns)
+
+
+def payload(request):
+    """Return the submitted data of a form-encoded or JSON request."""
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Malformed JSON')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Expected a JSON object')
+    return data
+
+
+def saved(form):
+    if not form.is_valid():
+        raise ApiError(
+            400, 'Invalid data', errors=form.errors.get_json_data())
+    return form.save(commit=False)
+
+
+def get_post(username, post_id, columns):
+    row = values(Post.objects.filter(
+        pk=post_id, author__username=username), columns).first()
+    if row is None:
+        raise Http404
+    return row
+
+
+@api_view('GET')
+def index(request):
+    return post_list(request, Post.objects.all())
+
+
+@api_view('GET')
+@conditional(group_metadata)
+def group_post(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return post_list(request, group.posts.all())
+
+
+@api_view('GET')
+def trending(request, slug=None):
+    posts = Post.objects.all()
+    if slug is not None:
+        group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+        posts = group.posts.all()
+    columns = selected(request, POST_COLUMNS)
+    rows = trending_posts(values(posts, columns), trending_amount)
+    return JsonResponse({'results': [serialize(row, columns)
+                                     for row in rows]})
+
+
+@api_view('GET', login=True)
+def follow_index(request):
+    columns = selected(request, POST_COLUMNS)
+    paginator = FeedPaginator(
+        request.user, page_amount,
+        values(Post.objects.all(), columns, 'id', 'pub_date'))
+    return page_response(request, paginator, columns)
+
+
+@api_view('GET')
+@conditional(profile_metadata)
+def profile(request, username):
+    author = values(
+        User.objects.filter(username=username), AUTHOR_COLUMNS, 'id').first()
+    if author is None:
+        raise Http404
+    columns = selected(request, POST_COLUMNS)
+    paginator = CursorPaginator(
+        values(Post.objects.filter(author_id=author['id']), columns,
+               'id', 'pub_date'),
+        page_amount)
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author_id=author['id']).exists())
+    return page_response(
+        request, paginator, columns,
+        author={**serialize(author, AUTHOR_COLUMNS),
+                'following': following})
+
+
+@api_view('GET')
+@conditional(post_page_metadata, viewed=count_post_view)
+def post_view(request, username, post_id):
+    columns = selected(request, POST_COLUMNS)
+    row = get_post(username, post_id, columns)
+    return JsonResponse(serialize(row, columns))
+
+
+@api_view('GET', 'POST')
+def post_comments(request, username, post_id):
+    if request.method == 'POST':
+        return add_comment(request, username, post_id)
+    return comment_list(request, username, post_id)
+
+
+@conditional(post_metadata)
+def comment_list(request, username, post_id):
+    get_post(username, post_id, {'id': 'id'})
+    columns = selected(request, COMMENT_COLUMNS)
+    paginator = CommentPaginator(
+        values(Comment.objects.filter(post_id=post_id), columns,
+               'id', 'created'),
+        comments_page_amount)
+    return page_response(request, paginator, columns)
+
+
+def add_comment(request, username, post_id):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Authentication required')
+    get_post(username, post_id, {'id': 'id'})
+    comment = saved(CommentForm(payload(request)))
+    comment.author = request.user
+    comment.post_id = post_id
+    comment.save()
+    row = values(Comment.objects.filter(pk=comment.pk),
+                 COMMENT_COLUMNS).get()
+    return JsonResponse(serialize(row, COMMENT_COLUMNS), status=201)
+
+
+@api_view('POST', login=True)
+def new_post(request):
+    post = saved(PostForm(payload(request), request.FILES or None))
+    post.author = request.user
+    post.save()
+    if post.image:
+        schedule_thumbnails(post)
+    row = get_post(request.user.username, post.pk, POST_COLUMNS)
+    return JsonResponse(serialize(row, POST_COLUMNS), status=201)
+
+
+@api_view('POST', login=True)
+def post_edit(request, username, post_id):
+    post = get_object_or_404(
+        Post, pk=post_id, author__username=username)
+    if post.author_id != request.user.pk:
+        raise ApiError(403, 'Only the author can edit a post')
+    form = PostForm(payload(request), request.FILES or None, instance=post)
+    post = saved(form)
+    post.save()
+    if 'image' in form.changed_data:
+        schedule_thumbnails(post)
+    row = get_post(username, post_id, POST_COLUMNS)
+    return JsonResponse(serialize(row, POST_COLUMNS))
+
+
+@api_view('POST', login=True)
+def profile_follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if author == request.user:
+        raise ApiError(400, 'Users cannot follow themselves')
+    Follow.objects.get_or_create(user=request.user, author=author)
+    return JsonResponse({'following': True})
+
+
+@api_view('POST', login=True)
+def profile_unfollow(request, username):
+    author = get_object_or_404(User, username=username)
+    Follow.objects.filter(user=request.user, author=author).delete()
+    return JsonResponse({'following': False})
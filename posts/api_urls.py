@@ -0,0 +1,24 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('', api.index, name='index'),
+    path('group/<slug:slug>/', api.group_post, name='group'),
+    path('group/<slug:slug>/trending/', api.trending, name='group_trending'),
+    path('trending/', api.trending, name='trending'),
+    path('new/', api.new_post, name='new_post'),
+    path('follow/', api.follow_index, name='follow_index'),
+    path('<str:username>/<int:post_id>/', api.post_view, name='post'),
+    path('<str:username>/<int:post_id>/edit/', api.post_edit,
+         name='post_edit'),
+    path('<str:username>/<int:post_id>/comments/', api.post_comments,
+         name='comments'),
+    path('<str:username>/follow/', api.profile_follow,
+         name='profile_follow'),
+    path('<str:username>/unfollow/', api.profile_unfollow,
+         name='profile_unfollow'),
+    path('<str:username>/', api.profile, name='profile'),
+]
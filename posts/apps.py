@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     name = "posts"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        if getattr(settings, 'TEMPLATE_PROFILING', False):
+            from .instrumentation import profile_templates
+            profile_templates()
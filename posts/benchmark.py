@@ -0,0 +1,421 @@
+"""Synthetic data and request timing for the benchmark commands."""
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models import Profile
+
+from .feed import backfill_feed
+from .models import Comment, Follow, Group, Post
+from .trending import event_score
+
+User = get_user_model()
+
+WORDS = (
+    'привет', 'сегодня', 'погода', 'город', 'друзья', 'новости', 'кот',
+    'работа', 'отпуск', 'книга', 'музыка', 'фото', 'вечер', 'утро', 'море',
+    'python', 'django', 'yatube', 'проект', 'идея', 'спасибо', 'лето',
+)
+PATHS = ('index', 'group_post', 'profile', 'post_view', 'follow_index',
+         'trending')
+
+
+def words(rng, amount):
+    return ' '.join(rng.choice(WORDS) for _ in range(amount))
+
+
+def seed(users, groups, posts, follows, comments, batch_size=500,
+         seed_value=0, stdout=None):
+    """Bulk-create a synthetic dataset and its derived rows.
+
+    ``follows`` is the number of authors each user follows. Rows are
+    inserted with ``bulk_create``, which skips model signals, so feeds
+    and counters are rebuilt afterwards the way the signals would have
+    left them.
+    """
+    rng = random.Random(seed_value)
+
+    def report(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    first = User.objects.count()
+    User.objects.bulk_create(
+        (User(username=f'bench{first + i}', password='!')
+         for i in range(users)), batch_size=batch_size)
+    user_ids = list(User.objects.filter(
+        username__startswith='bench').values_list('pk', flat=True))
+    Profile.objects.bulk_create(
+        (Profile(user_id=pk) for pk in user_ids),
+        batch_size=batch_size, ignore_conflicts=True)
+    report(f'Users: {len(user_ids)}')
+
+    first = Group.objects.count()
+    Group.objects.bulk_create(
+        Group(title=f'Группа {first + i}', slug=f'bench-{first + i}',
+              description=words(rng, 10))
+        for i in range(groups))
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    report(f'Groups: {len(group_ids)}')
+
+    Post.objects.bulk_create(
+        (Post(author_id=rng.choice(user_ids),
+              group_id=rng.choice(group_ids + [None]),
+              text=words(rng, rng.randint(5, 60)),
+              trend_score=event_score('post'))
+         for _ in range(posts)), batch_size=batch_size)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    report(f'Posts: {len(post_ids)}')
+
+    pairs = set()
+    for user_id in user_ids:
+        for author_id in rng.sample(user_ids, min(follows, len(user_ids))):
+            if author_id != user_id:
+                pairs.add((user_id, author_id))
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in pairs),
+        batch_size=batch_size, ignore_conflicts=True)
+    for user_id, author_id in pairs:
+        backfill_feed(user_id, author_id)
+    report(f'Follows: {len(pairs)}')
+
+    Comment.objects.bulk_create(
+        (Comment(post_id=rng.choice(post_ids),
+                 author_id=rng.choice(user_ids),
+                 text=words(rng, rng.randint(3, 20)))
+         for _ in range(comments)), batch_size=batch_size)
+    report(f'Comments: {comments}')
+
+    call_command('reconcile_counters', stdout=stdout or StringIO())
+
+
+def sample_urls(rng, amount, pages):
+    """Return ``{path: [(url, user)]}`` of requests to replay."""
+    authors = list(User.objects.filter(posts__isnull=False).distinct())
+    readers = list(User.objects.filter(follower__isnull=False).distinct())
+    groups = list(Group.objects.filter(posts__isnull=False).distinct())
+    posts = list(Post.objects.select_related('author').order_by('?')[:50])
+    urls = {path: [] for path in PATHS}
+    for _ in range(amount):
+        post = rng.choice(posts)
+        urls['index'].append((reverse('posts:index'), None))
+        urls['group_post'].append(
+            (reverse('posts:group', args=[rng.choice(groups).slug]), None))
+        urls['profile'].append((
+            reverse('posts:profile', args=[rng.choice(authors).username]),
+            None))
+        urls['post_view'].append((
+            reverse('posts:post', args=[post.author.username, post.pk]),
+            None))
+        urls['follow_index'].append(
+            (reverse('posts:follow_index'), rng.choice(readers)))
+        urls['trending'] += [
+            (reverse('posts:trending'), None),
+            (reverse('posts:group_trending', args=[rng.choice(groups).slug]),
+             None)]
+    for path in ('index', 'follow_index'):
+        urls[path] = [
+            (url, user) for base, user in urls[path]
+            for url in _deep_urls(base, user, pages)]
+    return urls
+
+
+def _deep_urls(url, user, pages):
+    """Return ``url`` followed by the cursor URLs of its next pages."""
+    client = _client(user)
+    urls = [url]
+    for _ in range(pages - 1):
+        page = client.get(urls[-1]).context['page']
+        if not page.has_next():
+            break
+        urls.append(f'{url}?cursor={page.next_cursor}')
+    return urls
+
+
+def _client(user):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(share * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(urls):
+    """Replay ``urls`` and return per-path latency, query and memory stats.
+
+    Latency is in milliseconds. Memory is the peak of Python allocations
+    during one extra request, traced separately so that tracing does not
+    skew the timings.
+    """
+    results = {}
+    for path, requests in urls.items():
+        timings = []
+        queries = []
+        clients = {}
+        for url, user in requests:
+            client = clients.setdefault(user, _client(user))
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+            queries.append(len(captured))
+
+        url, user = requests[0]
+        tracemalloc.start()
+        clients[user].get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[path] = {
+            'requests': len(timings),
+            'p50': percentile(timings, 0.50),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+            'mean_queries': statistics.mean(queries),
+            'max_queries': max(queries),
+            'peak_kib': peak / 1024,
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return messages for paths slower or chattier than ``baseline``."""
+    regressions = []
+    for path, stats in results.items():
+        before = baseline.get(path)
+        if before is None:
+            continue
+        if stats['p95'] > before['p95'] * (1 + tolerance):
+            regressions.append(
+                f'{path}: p95 {before["p95"]:.1f} -> {stats["p95"]:.1f} ms')
+        if stats['max_queries'] > before['max_queries']:
+            regressions.append(
+                f'{path}: queries {before["max_queries"]} -> '
+                f'{stats["max_queries"]}')
+    return regressions
+
+
+class ConcurrentLoad:
+    """Reads and post publications replayed from several threads at once.
+
+    Each reader thread cycles through ``urls`` and each writer thread
+    posts through ``posts:new_post`` until ``seconds`` pass.
+    """
+
+    def __init__(self, urls, readers, writers, seconds):
+        self.requests = [request for path in urls.values()
+                         for request in path]
+        self.readers = readers
+        self.writers = list(User.objects.filter(
+            username__startswith='bench')[:writers])
+        self.seconds = seconds
+        self.intervals = {'read': [], 'write': []}
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def run(self):
+        """Return latency stats of reads and writes, failed requests and
+        the share of reads that ran while a write was in progress."""
+        self.deadline = time.monotonic() + self.seconds
+        threads = [
+            threading.Thread(target=self.read, args=(number,))
+            for number in range(self.readers)
+        ] + [threading.Thread(target=self.write, args=(user,))
+             for user in self.writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        results = {
+            'errors': len(self.errors),
+            'error_kinds': sorted(set(self.errors)),
+            'overlapping_reads': overlapping_share(
+                self.intervals['read'], self.intervals['write']),
+        }
+        for kind, spans in self.intervals.items():
+            timings = [(end - start) * 1000 for start, end in spans]
+            results[kind] = {
+                'requests': len(timings),
+                'per_second': len(timings) / self.seconds,
+                'p50': percentile(timings, 0.50) if timings else None,
+                'p95': percentile(timings, 0.95) if timings else None,
+            }
+        return results
+
+    def timed(self, kind, call):
+        started = time.perf_counter()
+        try:
+            response = call()
+        except OperationalError as error:
+            failure = str(error)
+        else:
+            failure = (str(response.status_code)
+                       if response.status_code >= 400 else None)
+        finished = time.perf_counter()
+        with self.lock:
+            if failure is None:
+                self.intervals[kind].append((started, finished))
+            else:
+                self.errors.append(failure)
+
+    def read(self, offset):
+        clients = {}
+        index = offset
+        try:
+            while time.monotonic() < self.deadline:
+                url, user = self.requests[index % len(self.requests)]
+                client = clients.setdefault(user, _client(user))
+                self.timed('read', lambda: client.get(url))
+                index += 1
+        finally:
+            connection.close()
+
+    def write(self, user):
+        client = _client(user)
+        rng = random.Random(user.pk)
+        try:
+            while time.monotonic() < self.deadline:
+                self.timed('write', lambda: client.post(
+                    reverse('posts:new_post'), {'text': words(rng, 20)}))
+        finally:
+            connection.close()
+
+
+def overlapping_share(reads, writes):
+    """Return the share of ``reads`` that overlap at least one write."""
+    if not reads:
+        return 0.0
+    writes = sorted(writes)
+    starts = [start for start, _ in writes]
+    latest_ends = list(accumulate((end for _, end in writes), max))
+    overlapping = 0
+    for start, end in reads:
+        earlier = bisect_left(starts, end)
+        if earlier and latest_ends[earlier - 1] > start:
+            overlapping += 1
+    return overlapping / len(reads)
+
+
+@contextmanager
+def scratch_database(options=None):
+    """Point ``default`` at a migrated SQLite file in a temporary directory.
+
+    Unlike the in-memory test database, a file is shared by the threads of
+    a concurrent load. ``options`` are merged into the connection's.
+    """
+    settings_dict = connection.settings_dict
+    old_name, old_options = settings_dict['NAME'], settings_dict['OPTIONS']
+    directory = tempfile.mkdtemp()
+    connection.close()
+    settings_dict['NAME'] = os.path.join(directory, 'db.sqlite3')
+    settings_dict['OPTIONS'] = {**old_options, **(options or {})}
+    try:
+        call_command('migrate', verbosity=0)
+        yield
+    finally:
+        connection.close()
+        settings_dict['NAME'] = old_name
+        settings_dict['OPTIONS'] = old_options
+        shutil.rmtree(directory)
+
+
+class AsgiLoad:
+    """Concurrent clients replaying requests against an ASGI application.
+
+    ``requests`` maps a kind to ``(url, user)`` pairs; ``clients`` maps it
+    to the number of clients cycling through them until ``seconds`` pass.
+    All clients share one event loop, as they would share a server.
+    """
+
+    def __init__(self, requests, clients, seconds):
+        self.requests = {
+            kind: [(url, self.cookie(user)) for url, user in pairs]
+            for kind, pairs in requests.items()}
+        self.clients = clients
+        self.seconds = seconds
+
+    @staticmethod
+    def cookie(user):
+        cookies = _client(user).cookies
+        return '; '.join(
+            f'{name}={morsel.value}' for name, morsel in cookies.items())
+
+    def run(self, application):
+        """Return per-kind request rate and latency, and failed requests."""
+        self.timings = {kind: [] for kind in self.requests}
+        self.errors = 0
+        asyncio.run(self.load(application))
+        results = {'errors': self.errors}
+        for kind, timings in self.timings.items():
+            results[kind] = {
+                'requests': len(timings),
+                'per_second': len(timings) / self.seconds,
+                'p50': percentile(timings, 0.50) if timings else None,
+                'p95': percentile(timings, 0.95) if timings else None,
+            }
+        return results
+
+    async def load(self, application):
+        deadline = time.monotonic() + self.seconds
+        await asyncio.gather(*(
+            self.client(application, kind, offset, deadline)
+            for kind, amount in self.clients.items()
+            for offset in range(amount)))
+
+    async def client(self, application, kind, offset, deadline):
+        requests = self.requests[kind]
+        while time.monotonic() < deadline:
+            url, cookie = requests[offset % len(requests)]
+            offset += 1
+            started = time.perf_counter()
+            status = await self.get(application, url, cookie)
+            if status >= 400:
+                self.errors += 1
+            else:
+                self.timings[kind].append(
+                    (time.perf_counter() - started) * 1000)
+
+    async def get(self, application, url, cookie):
+        url_path, _, query = url.partition('?')
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': url_path,
+            'query_string': query.encode(),
+            'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        }
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        await application(scope, receive, send)
+        return sent[0]['status']
@@ -0,0 +1,90 @@
+"""Namespaced access to the shared cache with stampede protection."""
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+class CacheNamespace:
+    """Keys of one feature, stored as ``<name>:<key>`` under ``version``.
+
+    Bumping ``version`` drops every key of the namespace at once without
+    touching the keys of other features sharing the cache.
+    """
+
+    def __init__(self, name, version=1, alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.version = version
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f'{self.name}:{key}'
+
+    def get(self, key, default=None):
+        return self.cache.get(
+            self.make_key(key), default, version=self.version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(
+            self.make_key(key), value, timeout, version=self.version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return self.cache.add(
+            self.make_key(key), value, timeout, version=self.version)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key), version=self.version)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(
+            [self.make_key(key) for key in keys], version=self.version)
+
+    def get_or_compute(self, key, compute, timeout, grace=60,
+                       lock_timeout=10, wait=1):
+        """Return the cached value of ``key``, computing it when missing.
+
+        Values are kept ``grace`` seconds past ``timeout``. Once a value
+        goes stale, the first caller takes a lock and recomputes it while
+        everyone else keeps getting the stale copy. When there is no copy
+        at all, other callers wait up to ``wait`` seconds for the lock
+        holder before computing the value themselves. ``timeout=None``
+        keeps the value until it is deleted.
+        """
+        entry = self.get(key)
+        if entry is not None and not _expired(entry):
+            return entry[1]
+        lock = f'{key}:lock'
+        if self.add(lock, True, lock_timeout):
+            try:
+                return self._store(key, compute(), timeout, grace)
+            finally:
+                self.delete(lock)
+        if entry is not None:
+            return entry[1]
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self.get(key)
+            if entry is not None:
+                return entry[1]
+        return compute()
+
+    def replace(self, key, value, timeout, grace=60):
+        """Store ``value`` in the format read by ``get_or_compute``."""
+        self._store(key, value, timeout, grace)
+
+    def _store(self, key, value, timeout, grace):
+        if timeout is None:
+            self.set(key, (None, value), None)
+        else:
+            self.set(key, (time.time() + timeout, value), timeout + grace)
+        return value
+
+
+def _expired(entry):
+    fresh_until = entry[0]
+    return fresh_until is not None and fresh_until <= time.time()
@@ -0,0 +1,124 @@
+"""Conditional GET for pages whose content is covered by version tokens.
+
+Each page has a metadata function that returns the fragment version
+tokens of what it shows and the latest publication dates in scope, both
+read with cheap lookups, plus the position of the database they were
+read from. Tokens cover the page's own scope only: profile and group
+tokens are bumped by changes to the posts and comments they list, so
+activity elsewhere on the site keeps their ETags. The ETag hashes the
+tokens with the viewer, and Last-Modified is the newest of the dates and
+the token bump times, so a matching client gets ``304 Not Modified``
+before any feed query runs or any template is rendered. Side effects of
+a visit, such as counting a post view, go in ``viewed``, which runs for
+304 answers as well.
+"""
+from functools import wraps
+from hashlib import sha1
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .fragments import (group_version, post_version, profile_version,
+                        read_version, version_time)
+from .models import Group, Post
+
+User = get_user_model()
+
+
+def conditional(metadata, viewed=None):
+    """Answer conditional GETs of the view from ``metadata``.
+
+    ``metadata`` takes the view arguments and returns ``(tokens, dates)``,
+    or ``None`` when the page does not exist, which lets the view answer.
+    Responses must be revalidated, so edits show up on the next request.
+    ``viewed`` is called with the view arguments after every successful
+    GET, whether the view ran or not.
+    """
+    def cached_metadata(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_metadata'):
+            result = metadata(*args, **kwargs)
+            if result is not None:
+                tokens, dates = result
+                result = (*tokens, read_version()), dates
+            request._conditional_metadata = result
+        return request._conditional_metadata
+
+    def etag(request, *args, **kwargs):
+        result = cached_metadata(request, *args, **kwargs)
+        if result is None:
+            return None
+        tokens, _ = result
+        viewer = str(request.user.pk)
+        return sha1(':'.join((viewer, *tokens)).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        result = cached_metadata(request, *args, **kwargs)
+        if result is None:
+            return None
+        tokens, dates = result
+        dates = [*dates, *map(version_time, tokens)]
+        return max((date for date in dates if date is not None),
+                   default=None)
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            record_visit(viewed, request, response, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def record_visit(viewed, request, response, *args, **kwargs):
+    if viewed is not None and request.method == 'GET' and (
+            response.status_code in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED)):
+        viewed(*args, **kwargs)
+
+
+def author_id(username):
+    return User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+
+
+def post_metadata(username, post_id, counted=False):
+    user_id = author_id(username)
+    post = Post.objects.filter(pk=post_id).values(
+        'pub_date', 'view_count').annotate(
+        commented=Max('comments__created')).order_by().first()
+    if user_id is None or post is None:
+        return None
+    tokens = (post_version(post_id), profile_version(user_id))
+    if counted:
+        tokens += (f'views:{post["view_count"]}',)
+    return tokens, (post['pub_date'], post['commented'])
+
+
+def post_page_metadata(username, post_id):
+    """``post_metadata`` of a page that shows the stored view count."""
+    return post_metadata(username, post_id, counted=True)
+
+
+def profile_metadata(username):
+    user_id = author_id(username)
+    if user_id is None:
+        return None
+    latest = Post.objects.filter(author_id=user_id).aggregate(
+        latest=Max('pub_date'))['latest']
+    return (profile_version(user_id),), (latest,)
+
+
+def group_metadata(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return None
+    latest = Post.objects.filter(group_id=group_id).aggregate(
+        latest=Max('pub_date'))['latest']
+    return (group_version(group_id),), (latest,)
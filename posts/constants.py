@@ -1,5 +1,25 @@
 # app_constants
 page_amount = 10
+# comments per page of a post's thread
+comments_page_amount = 20
+# authors with this many followers are pulled into feeds on read
+popular_author_followers = 1000
+# latest posts copied into a timeline when following an author
+feed_backfill_amount = 200
+# search rank of a word in the post text relative to one in a comment
+search_text_weight = 3
+# pre-generated post image sizes, smallest first, and their formats
+thumbnail_sizes = {'small': (480, 170), 'card': (960, 339)}
+thumbnail_formats = ('webp', 'jpeg')
+# uploaded post images: size cap in bytes, longest side and JPEG quality
+image_max_upload_size = 20 * 1024 * 1024
+image_max_side = 2048
+image_quality = 85
+# trending: an engagement loses half its weight every trending_half_life
+# hours; trending_amount posts are shown
+trending_half_life = 12
+trending_weights = {'post': 1, 'view': 1, 'comment': 10}
+trending_amount = 30
 
 # test_constants
 
@@ -0,0 +1,282 @@
+"""Server-sent events telling followers about new posts.
+
+``follow_stream`` keeps a ``text/event-stream`` response open for each
+reader of ``/follow/`` and pushes a ``post`` event, with a summary of the
+post and how many new posts arrived since the page was loaded, when a
+followed author publishes. Posts the client missed since ``?last_id=``
+(the newest post on the page) or ``Last-Event-ID`` are sent first. Under
+ASGI the streams are coroutines on the event loop: an idle connection
+costs a queue, not a thread. The WSGI view ``posts.views.follow_events``
+answers the same URL with the missed posts and a long ``retry``, so there
+the browser polls, with one indexed query per poll.
+
+Events go through ``broker``. ``LocalBroker`` delivers to the streams of
+its own process only, so with several server processes it has to be
+replaced by a shared broker with the same ``subscribe``/``publish``
+methods, e.g. one on Redis pub/sub, named by ``EVENT_BROKER``.
+"""
+import asyncio
+import json
+import textwrap
+import threading
+from collections import defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .models import Follow, Post
+
+# Events a slow stream may fall behind by before it is told to reload
+QUEUE_SIZE = 100
+# Most posts a (re)connecting client is sent, oldest first
+BACKLOG_SIZE = 50
+
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Messages of some channels, queued for one coroutine."""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+        self.channels = set()
+        for channel in channels:
+            self.add(channel)
+
+    def add(self, channel):
+        self.channels.add(channel)
+        self.broker.attach(self, channel)
+
+    def remove(self, channel):
+        self.channels.discard(channel)
+        self.broker.detach(self, channel)
+
+    def close(self):
+        for channel in list(self.channels):
+            self.remove(channel)
+
+    def deliver(self, message):
+        """Queue ``message``; safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """In-process publish/subscribe between threads and the event loop."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = defaultdict(set)
+
+    def subscribe(self, channels):
+        return Subscription(self, channels)
+
+    def attach(self, subscription, channel):
+        with self.lock:
+            self.channels[channel].add(subscription)
+
+    def detach(self, subscription, channel):
+        with self.lock:
+            subscriptions = self.channels.get(channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.channels[channel]
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+
+broker = import_string(
+    getattr(settings, 'EVENT_BROKER', 'posts.events.LocalBroker'))()
+
+
+def post_summary(post, author_name):
+    return {
+        'id': post.pk,
+        'author': author_name,
+        'text': textwrap.shorten(post.text, 140),
+        'url': reverse('posts:post', args=[author_name, post.pk]),
+        'pub_date': post.pub_date.isoformat(),
+    }
+
+
+def publish_post(post):
+    broker.publish(author_channel(post.author_id), {
+        'type': 'post', 'post': post_summary(post, post.author.username)})
+
+
+def publish_follow(user_id, author_id, following):
+    broker.publish(user_channel(user_id), {
+        'type': 'follow', 'author': author_id, 'following': following})
+
+
+def format_event(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def last_ids(request):
+    """Return the ``last_id`` the page was loaded with and the last event
+    the client saw, from ``Last-Event-ID`` on reconnects; ``None`` when
+    missing or malformed."""
+    ids = []
+    for value in (request.GET.get('last_id'),
+                  request.META.get('HTTP_LAST_EVENT_ID')):
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            ids.append(None)
+    loaded, seen = ids
+    return loaded, seen if seen is not None else loaded
+
+
+def backlog(user, request):
+    """Return ``(events, count)`` of posts the client has not seen.
+
+    ``count`` is the number of followed authors' posts since the page was
+    loaded, and each event is ``(number of that post, summary)``.
+    """
+    loaded, seen = last_ids(request)
+    if loaded is None:
+        return [], 0
+    posts = Post.objects.filter(
+        author__following__user=user, pk__gt=loaded,
+    ).select_related('author').order_by('pk')[:BACKLOG_SIZE]
+    summaries = [post_summary(post, post.author.username) for post in posts]
+    events = [
+        (number, summary)
+        for number, summary in enumerate(summaries, 1)
+        if summary['id'] > seen]
+    return events, len(summaries)
+
+
+def post_event(number, summary):
+    return format_event(
+        'post', {'new': number, 'post': summary}, summary['id'])
+
+
+def follower(environ):
+    """Return the logged in user and the request of a stream.
+
+    ``None`` when nobody is logged in. Runs in a worker thread.
+    """
+    close_old_connections()
+    try:
+        request = WSGIRequest(environ)
+        engine = import_module(settings.SESSION_ENGINE)
+        request.session = engine.SessionStore(
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        user = get_user(request)
+        if not user.is_authenticated:
+            return None
+        request.user = user
+        return request, list(Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True))
+    finally:
+        close_old_connections()
+
+
+def missed(request):
+    """``backlog`` of a stream, run in a worker thread."""
+    close_old_connections()
+    try:
+        return backlog(request.user, request)
+    finally:
+        close_old_connections()
+
+
+async def follow_stream(scope, receive, send, environ, run_sync):
+    """Stream ``post`` events of followed authors until the client leaves.
+
+    The subscription starts before the missed posts are read, so no post
+    falls in between; posts both read and published are sent once.
+    """
+    found = await run_sync(follower, environ)
+    if found is None:
+        await send({'type': 'http.response.start', 'status': 403,
+                    'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    request, author_ids = found
+    subscription = broker.subscribe(
+        [user_channel(request.user.pk), *map(author_channel, author_ids)])
+    events, new = await run_sync(missed, request)
+    last_id = max((summary['id'] for _, summary in events), default=0)
+    disconnect = asyncio.ensure_future(receive())
+    message = asyncio.ensure_future(subscription.get())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body', 'more_body': True,
+            'body': b'retry: 5000\n\n' + b''.join(
+                post_event(number, summary) for number, summary in events)})
+        keepalive = getattr(settings, 'EVENTS_KEEPALIVE', 15)
+        while True:
+            done, _ = await asyncio.wait(
+                {disconnect, message}, timeout=keepalive,
+                return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                break
+            if message not in done:
+                chunk = b': keepalive\n\n'
+            else:
+                event = message.result()
+                message = asyncio.ensure_future(subscription.get())
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    chunk = format_event('resync', {})
+                elif event['type'] == 'follow':
+                    channel = author_channel(event['author'])
+                    if event['following']:
+                        subscription.add(channel)
+                    else:
+                        subscription.remove(channel)
+                    continue
+                elif event['post']['id'] > last_id:
+                    new += 1
+                    chunk = post_event(new, event['post'])
+                else:
+                    continue
+            await send({'type': 'http.response.body', 'body': chunk,
+                        'more_body': True})
+    finally:
+        subscription.close()
+        message.cancel()
+        disconnect.cancel()
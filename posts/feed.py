@@ -0,0 +1,195 @@
+"""Materialized follow feed.
+
+Posts are copied into ``FeedEntry`` rows of every follower when they are
+saved (fan-out-on-write), so reading ``/follow/`` is a range scan over the
+reader's own timeline. Authors with at least ``popular_author_followers``
+followers are not fanned out: their posts are pulled on read and merged
+with the timeline page. New posts and follows are delivered by the
+``posts.tasks`` workers.
+"""
+import heapq
+from collections import defaultdict
+
+from django.db.models import Count, Q
+
+from .caching import CacheNamespace
+from .constants import feed_backfill_amount, popular_author_followers
+from .models import FeedEntry, Follow, Post
+from .paginator import NEXT, CursorPaginator
+from .tasks import task
+
+feed_cache = CacheNamespace('feed')
+
+
+def count_popular_authors():
+    # the set is cached for every reader, so it must not come from a
+    # lagging replica
+    return set(
+        Follow.objects.using('default').values('author')
+        .annotate(followers=Count('user'))
+        .filter(followers__gte=popular_author_followers)
+        .values_list('author', flat=True))
+
+
+def popular_authors():
+    """Return ids of authors whose posts are pulled instead of pushed.
+
+    The set only grows while cached; it is rebuilt from ``Follow`` when the
+    cache is cold.
+    """
+    return feed_cache.get_or_compute(
+        'popular_authors', count_popular_authors, None)
+
+
+def mark_popular(author_id):
+    authors = popular_authors()
+    if author_id not in authors:
+        feed_cache.replace('popular_authors', authors | {author_id}, None)
+
+
+def fan_out_post(post):
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """Copy saved posts into their followers' timelines.
+
+    Followers of every author in ``posts`` are read with one query and all
+    entries are written with one insert.
+    """
+    popular = popular_authors()
+    authors = {post.author_id for post in posts} - popular
+    if not authors:
+        return
+    followers = defaultdict(list)
+    for author_id, user_id in Follow.objects.filter(
+            author_id__in=authors).values_list('author_id', 'user_id'):
+        followers[author_id].append(user_id)
+    for author_id in authors:
+        if len(followers[author_id]) >= popular_author_followers:
+            mark_popular(author_id)
+            del followers[author_id]
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date)
+         for post in posts for user_id in followers.get(post.author_id, ())),
+        ignore_conflicts=True)
+
+
+@task(batch=True)
+def deliver_posts(calls):
+    """Fan out the posts of ``(post_id,)`` calls that still exist."""
+    fan_out_posts(list(Post.objects.filter(
+        pk__in=[post_id for post_id, in calls]).only('author', 'pub_date')))
+
+
+def existing_follows(pairs):
+    return set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        author_id__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id')) & pairs
+
+
+@task(batch=True)
+def deliver_followed_posts(calls):
+    """Backfill the timelines of ``(user_id, author_id)`` follows.
+
+    Follows undone since the call are skipped.
+    """
+    backfill_feeds(existing_follows({tuple(call) for call in calls}))
+
+
+@task(batch=True)
+def remove_unfollowed_posts(calls):
+    """Prune the timelines of ``(user_id, author_id)`` unfollows.
+
+    Follows made again since the call are skipped.
+    """
+    pairs = {tuple(call) for call in calls}
+    for user_id, author_id in pairs - existing_follows(pairs):
+        prune_feed(user_id, author_id)
+
+
+def backfill_feed(user_id, author_id):
+    backfill_feeds([(user_id, author_id)])
+
+
+def backfill_feeds(follows):
+    """Copy the latest posts of followed authors into the timelines.
+
+    ``follows`` holds ``(user_id, author_id)`` pairs; the posts of each
+    author are read once and all entries are written with one insert.
+    """
+    popular = popular_authors()
+    followers = defaultdict(list)
+    for user_id, author_id in follows:
+        if author_id not in popular:
+            followers[author_id].append(user_id)
+    entries = []
+    for author_id, user_ids in followers.items():
+        posts = Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date')[:feed_backfill_amount]
+        entries.extend(
+            FeedEntry(
+                user_id=user_id,
+                post_id=pk,
+                author_id=author_id,
+                pub_date=pub_date)
+            for pk, pub_date in posts for user_id in user_ids)
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def prune_feed(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class FeedPaginator(CursorPaginator):
+    """Cursor paginator over a user's materialized timeline.
+
+    Each page is one range query on the reader's ``FeedEntry`` rows plus,
+    when the user follows popular authors, one range query on their posts.
+    The timeline condition is added in ``_where`` so that it shares the
+    ``FeedEntry`` join with the cursor range. ``posts`` replaces the feed
+    card queryset, e.g. with ``.values()`` rows.
+    """
+    key_fields = ('feed_entries__pub_date', 'feed_entries__post')
+
+    def __init__(self, user, per_page, posts=None):
+        self.user = user
+        self.posts = Post.objects.for_feed() if posts is None else posts
+        super().__init__(self.posts, per_page)
+
+    def _where(self, direction, key):
+        return Q(feed_entries__user=self.user) & super()._where(
+            direction, key)
+
+    def _query(self, direction, key):
+        posts = super()._query(direction, key)
+        pulled = self._pulled_authors()
+        if not pulled:
+            return posts
+        popular = CursorPaginator(
+            self.posts.filter(author_id__in=pulled), self.per_page)
+        merged = heapq.merge(
+            posts, popular._query(direction, key),
+            key=self.key,
+            reverse=direction == NEXT)
+        seen = set()
+        rows = []
+        for post in merged:
+            pk = self.key(post)[1]
+            if pk not in seen:
+                seen.add(pk)
+                rows.append(post)
+        return rows[:self.per_page + 1]
+
+    def _pulled_authors(self):
+        authors = popular_authors()
+        if not authors:
+            return ()
+        return list(Follow.objects.filter(
+            user=self.user,
+            author_id__in=authors).values_list('author_id', flat=True))
@@ -1,6 +1,10 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
 from .models import Comment, Post
+from .uploads import normalize_image
 
 
 # verbos_name, help_text are include in models
@@ -9,6 +13,29 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image',)
 
+    too_large_message = 'Файл слишком большой.'
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        # a truncated upload must not reach Pillow
+        if getattr(image, 'too_large', False):
+            raise ValidationError(self.too_large_message)
+        try:
+            return normalize_image(image, Post._meta.get_field('image'))
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise ValidationError(
+                'Не удалось обработать изображение.')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # the field itself may have rejected the truncated file first
+        if getattr(self.files.get('image'), 'too_large', False):
+            self.errors.pop('image', None)
+            self.add_error('image', self.too_large_message)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,108 @@
+"""Version tokens for cached feed and post card fragments.
+
+Fragment cache keys include these tokens, so bumping a token is enough to
+invalidate every fragment built from the old one. A fresh random token is
+used on every bump (and when the cache has lost it) so that an evicted
+token can never bring back fragments cached under an earlier value.
+Tokens start with the time of the bump, which conditional responses use
+as the last modification of what the token covers.
+
+Fragments and ETags also carry ``read_version()``, the position of the
+database the request reads: a token bumped by every ``sync_replicas``
+run for a replica. What a reader renders from a lagging replica is thus
+only reused for readers of the same copy, never under the primary's key
+or after the replica has caught up.
+"""
+import time
+import uuid
+from datetime import datetime, timezone
+
+from .caching import CacheNamespace
+from .replicas import current_replica
+
+FEED_VERSION_KEY = 'feed'
+POST_VERSION_KEY = 'post:{}'
+PROFILE_VERSION_KEY = 'profile:{}'
+GROUP_VERSION_KEY = 'group:{}'
+REPLICA_VERSION_KEY = 'replica:{}'
+PRIMARY_VERSION = 'primary'
+
+fragments_cache = CacheNamespace('fragments')
+
+
+def get_version(key):
+    version = fragments_cache.get(key)
+    if version is None:
+        version = bump_version(key)
+    return version
+
+
+def bump_version(key):
+    version = f'{time.time():f}:{uuid.uuid4().hex}'
+    fragments_cache.set(key, version, None)
+    return version
+
+
+def version_time(version):
+    """Return the aware datetime at which ``version`` was made."""
+    timestamp, _, _ = version.partition(':')
+    try:
+        return datetime.fromtimestamp(float(timestamp), timezone.utc)
+    except ValueError:
+        return None
+
+
+def feed_version():
+    return get_version(FEED_VERSION_KEY)
+
+
+def post_version(post_id):
+    return get_version(POST_VERSION_KEY.format(post_id))
+
+
+def profile_version(user_id):
+    return get_version(PROFILE_VERSION_KEY.format(user_id))
+
+
+def group_version(group_id):
+    return get_version(GROUP_VERSION_KEY.format(group_id))
+
+
+def read_version():
+    replica = current_replica.get()
+    if replica is None:
+        return PRIMARY_VERSION
+    return get_version(REPLICA_VERSION_KEY.format(replica))
+
+
+def invalidate_replica(alias):
+    bump_version(REPLICA_VERSION_KEY.format(alias))
+
+
+def invalidate_feed():
+    bump_version(FEED_VERSION_KEY)
+
+
+def invalidate_post(post_id):
+    bump_version(POST_VERSION_KEY.format(post_id))
+    bump_version(FEED_VERSION_KEY)
+
+
+def invalidate_profile(user_id):
+    bump_version(PROFILE_VERSION_KEY.format(user_id))
+
+
+def invalidate_many(post_ids=(), user_ids=()):
+    """Invalidate many posts and profiles with one cache deletion.
+
+    A deleted token is replaced by a fresh one when next read, which
+    invalidates like a bump without a write per key.
+    """
+    fragments_cache.delete_many(
+        [POST_VERSION_KEY.format(pk) for pk in post_ids]
+        + [PROFILE_VERSION_KEY.format(pk) for pk in user_ids])
+    invalidate_feed()
+
+
+def invalidate_group(group_id):
+    bump_version(GROUP_VERSION_KEY.format(group_id))
@@ -0,0 +1,340 @@
+"""Per-request timing of database, template and cache work.
+
+``InstrumentationMiddleware`` collects the time spent in each phase while
+a request is handled, reports it in the ``Server-Timing`` header and adds
+it to rolling per-view histograms served to staff by ``posts:stats``.
+Template time is measured by ``TimedDjangoTemplates`` and cache time by
+the ``Timed*Cache`` backends, so both have to be configured in settings.
+Phases nest: template time includes the queries and cache lookups the
+template triggers, and the database cache's queries count as db time too.
+
+With ``TEMPLATE_PROFILING`` on, ``template_profile`` also times every
+template, ``{% include %}`` and ``{% extends %}`` parent by name, for
+``posts:template_stats`` and ``benchmark --profile-templates``.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import MemcachedCache
+from django.db import connections
+from django.template import base
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+current = ContextVar('request_timings', default=None)
+
+
+class Timings:
+    """Time spent in each phase of one request, in milliseconds."""
+
+    def __init__(self, request):
+        self.request = request
+        self.db = self.template = self.cache = 0.0
+        self.queries = self.cache_calls = 0
+        self.in_cache = False
+
+    @property
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match is not None else None
+
+    def header(self, total):
+        return ', '.join((
+            f'db;dur={self.db:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template:.1f}',
+            f'cache;dur={self.cache:.1f};desc="{self.cache_calls} calls"',
+            f'total;dur={total:.1f}',
+        ))
+
+
+def _elapsed(started):
+    return (time.perf_counter() - started) * 1000
+
+
+class Histogram:
+    """Counts of request durations per bucket with phase totals."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.max = 0.0
+        self.totals = dict.fromkeys(
+            ('total', 'db', 'template', 'cache', 'queries'), 0.0)
+
+    def add(self, total, timings):
+        index = next(
+            (i for i, bound in enumerate(BUCKETS) if total <= bound),
+            len(BUCKETS))
+        self.counts[index] += 1
+        self.count += 1
+        self.max = max(self.max, total)
+        self.totals['total'] += total
+        for phase in ('db', 'template', 'cache', 'queries'):
+            self.totals[phase] += getattr(timings, phase)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max = max(self.max, other.max)
+        for phase, value in other.totals.items():
+            self.totals[phase] += value
+
+    def percentile(self, share):
+        """Return the upper bound of the bucket holding ``share``."""
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= share * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'requests': self.count,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+            'buckets': dict(zip(
+                [str(bound) for bound in BUCKETS] + ['inf'], self.counts)),
+            **{f'mean_{phase}': value / self.count
+               for phase, value in self.totals.items()},
+        }
+
+
+class ViewStats:
+    """Histograms per view and minute over the last ``window`` minutes."""
+
+    def __init__(self, window):
+        self.window = window
+        self.views = {}
+        self.lock = threading.Lock()
+
+    def record(self, view_name, total, timings, now=None):
+        minute = int((time.time() if now is None else now) // 60)
+        with self.lock:
+            minutes = self.views.setdefault(view_name, OrderedDict())
+            minutes.setdefault(minute, Histogram()).add(total, timings)
+            self._expire(minutes, minute)
+
+    def snapshot(self, now=None):
+        minute = int((time.time() if now is None else now) // 60)
+        result = {}
+        with self.lock:
+            for view_name, minutes in self.views.items():
+                self._expire(minutes, minute)
+                merged = Histogram()
+                for histogram in minutes.values():
+                    merged.merge(histogram)
+                if merged.count:
+                    result[view_name] = merged.as_dict()
+        return result
+
+    def _expire(self, minutes, minute):
+        while minutes and next(iter(minutes)) <= minute - self.window:
+            minutes.popitem(last=False)
+
+
+view_stats = ViewStats(getattr(settings, 'INSTRUMENTATION_WINDOW', 15))
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_query_ms = getattr(settings, 'SLOW_QUERY_MS', 100)
+
+    def __call__(self, request):
+        timings = Timings(request)
+        token = current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(
+                        self.time_query))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = _elapsed(started)
+        response['Server-Timing'] = timings.header(total)
+        if timings.view_name is not None:
+            view_stats.record(timings.view_name, total, timings)
+        return response
+
+    def time_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = _elapsed(started)
+            timings = current.get()
+            if timings is not None:
+                timings.db += duration
+                timings.queries += 1
+                if duration >= self.slow_query_ms:
+                    logger.warning(
+                        'Slow query in %s (%.1f ms): %s',
+                        timings.view_name, duration, sql)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings = current.get()
+            if timings is not None:
+                timings.template += _elapsed(started)
+
+
+class TemplateProfile:
+    """Render count and time of each template since the last reset.
+
+    ``total_ms`` includes the includes and parents rendered inside a
+    template, ``own_ms`` leaves them out. Fragments served by ``{% cache %}``
+    render no includes, so their cost only shows on a cache miss.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.templates = {}
+
+    def enter(self):
+        self.local.__dict__.setdefault('nested', []).append(0.0)
+
+    def leave(self, name, elapsed):
+        nested = self.local.nested
+        own = elapsed - nested.pop()
+        if nested:
+            nested[-1] += elapsed
+        with self.lock:
+            stats = self.templates.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += own
+
+    def snapshot(self):
+        with self.lock:
+            templates = sorted(
+                self.templates.items(), key=lambda item: -item[1][1])
+        return {
+            name: {'renders': renders,
+                   'total_ms': round(total, 3),
+                   'own_ms': round(own, 3),
+                   'mean_ms': round(total / renders, 3)}
+            for name, (renders, total, own) in templates}
+
+    def reset(self):
+        with self.lock:
+            self.templates = {}
+
+
+template_profile = TemplateProfile()
+
+
+def profile_templates():
+    """Start timing every template render into ``template_profile``.
+
+    Every template, whether rendered directly, included or extended, goes
+    through ``Template._render``, so that is wrapped, the way Django's test
+    environment instruments it.
+    """
+    render = base.Template._render
+    if hasattr(render, 'unprofiled'):
+        return
+
+    def profiled_render(template, context):
+        template_profile.enter()
+        started = time.perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            template_profile.leave(
+                template.name or '<string>', _elapsed(started))
+
+    profiled_render.unprofiled = render
+    base.Template._render = profiled_render
+
+
+def stop_profiling_templates():
+    base.Template._render = getattr(
+        base.Template._render, 'unprofiled', base.Template._render)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django templates whose top-level renders count as template time."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _timed(name):
+    def method(self, *args, **kwargs):
+        call = getattr(super(TimedCacheMixin, self), name)
+        timings = current.get()
+        if timings is None or timings.in_cache:
+            return call(*args, **kwargs)
+        timings.in_cache = True
+        started = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            timings.in_cache = False
+            timings.cache += _elapsed(started)
+            timings.cache_calls += 1
+    method.__name__ = name
+    return method
+
+
+class TimedCacheMixin:
+    """Counts the time of cache operations made during a request.
+
+    Operations a backend implements through other operations, like
+    ``get_many`` calling ``get``, count once.
+    """
+
+    add = _timed('add')
+    get = _timed('get')
+    set = _timed('set')
+    touch = _timed('touch')
+    delete = _timed('delete')
+    get_many = _timed('get_many')
+    set_many = _timed('set_many')
+    delete_many = _timed('delete_many')
+    has_key = _timed('has_key')
+    incr = _timed('incr')
+    decr = _timed('decr')
+
+
+class TimedDatabaseCache(TimedCacheMixin, DatabaseCache):
+    pass
+
+
+class TimedFileBasedCache(TimedCacheMixin, FileBasedCache):
+    pass
+
+
+class TimedLocMemCache(TimedCacheMixin, LocMemCache):
+    pass
+
+
+class TimedMemcachedCache(TimedCacheMixin, MemcachedCache):
+    pass
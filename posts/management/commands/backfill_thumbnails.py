@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import schedule_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Queue thumbnails of post images that have none.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Queue every post image, e.g. after a change of sizes.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            posts = posts.filter(thumbnails__isnull=True)
+        total = 0
+        for post in posts.only('image').order_by('pk').iterator():
+            schedule_thumbnails(post)
+            total += 1
+        self.stdout.write(f'Posts queued: {total}')
@@ -0,0 +1,113 @@
+import json
+import random
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts.benchmark import compare, measure, sample_urls, seed
+from posts.instrumentation import (profile_templates,
+                                   stop_profiling_templates, template_profile)
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database with synthetic data and report '
+            'latency, queries and memory of the main pages.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Authors followed by each user.')
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Requests per page.')
+        parser.add_argument(
+            '--pages', type=int, default=3,
+            help='Cursor pages walked from each index and follow request.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Reuse the benchmark database and its data between runs.')
+        parser.add_argument(
+            '--save-baseline', metavar='FILE',
+            help='Write the results to FILE as JSON.')
+        parser.add_argument(
+            '--baseline', metavar='FILE',
+            help='Compare with a saved baseline and fail on regressions.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed p95 slowdown against the baseline, as a share.')
+        parser.add_argument(
+            '--profile-templates', action='store_true',
+            help='Also report render time of each template and include.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.report(results)
+        if options['profile_templates']:
+            self.report_templates(template_profile.snapshot())
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                regressions = compare(
+                    results, json.load(file), options['tolerance'])
+            if regressions:
+                raise CommandError(
+                    'Regressions:\n' + '\n'.join(regressions))
+
+    def run(self, options):
+        if not Post.objects.exists():
+            seed(
+                options['users'], options['groups'], options['posts'],
+                options['follows'], options['comments'],
+                seed_value=options['seed'], stdout=self.stdout)
+        cache.clear()
+        urls = sample_urls(
+            random.Random(options['seed']), options['requests'],
+            options['pages'])
+        if not options['profile_templates']:
+            return measure(urls)
+        template_profile.reset()
+        profile_templates()
+        try:
+            return measure(urls)
+        finally:
+            stop_profiling_templates()
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"page":<14}{"requests":>9}{"p50 ms":>9}{"p95 ms":>9}'
+            f'{"p99 ms":>9}{"queries":>9}{"max":>5}{"peak KiB":>10}')
+        for path, stats in results.items():
+            self.stdout.write(
+                f'{path:<14}{stats["requests"]:>9}{stats["p50"]:>9.1f}'
+                f'{stats["p95"]:>9.1f}{stats["p99"]:>9.1f}'
+                f'{stats["mean_queries"]:>9.1f}{stats["max_queries"]:>5}'
+                f'{stats["peak_kib"]:>10.0f}')
+
+    def report_templates(self, templates):
+        self.stdout.write(
+            f'\n{"template":<32}{"renders":>9}{"total ms":>10}'
+            f'{"own ms":>10}{"mean ms":>9}')
+        for name, stats in templates.items():
+            self.stdout.write(
+                f'{name:<32}{stats["renders"]:>9}{stats["total_ms"]:>10.1f}'
+                f'{stats["own_ms"]:>10.1f}{stats["mean_ms"]:>9.3f}')
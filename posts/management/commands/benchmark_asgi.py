@@ -0,0 +1,110 @@
+import logging
+import random
+import time
+
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts.benchmark import AsgiLoad, sample_urls, scratch_database, seed
+from yatube.asgi import AsgiHandler
+
+
+class Command(BaseCommand):
+    help = ('Compare a thread-per-request WSGI deployment with the ASGI '
+            'one, which runs the follow feed and comments in their own '
+            'thread pool, under concurrent fast and slow requests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Request threads of each deployment.')
+        parser.add_argument(
+            '--slow-threads', type=int, default=2,
+            help='Of --threads, those the ASGI deployment keeps for the '
+                 'follow feed and comments.')
+        parser.add_argument('--fast-clients', type=int, default=16)
+        parser.add_argument('--slow-clients', type=int, default=16)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument(
+            '--feed-delay', type=float, default=50,
+            help='Milliseconds added to every timeline query, standing in '
+                 'for a loaded database.')
+
+    def handle(self, *args, **options):
+        deployments = {
+            'wsgi': (options['threads'], 0),
+            'asgi': (options['threads'] - options['slow_threads'],
+                     options['slow_threads']),
+        }
+        setup_test_environment()
+        try:
+            with scratch_database():
+                load = self.prepare(options)
+                delay = options['feed_delay'] / 1000
+
+                def slow_feed(execute, sql, params, many, context):
+                    if 'posts_feedentry' in sql:
+                        time.sleep(delay)
+                    return execute(sql, params, many, context)
+
+                def add_delay(sender, connection, **kwargs):
+                    connection.execute_wrappers.append(slow_feed)
+
+                connection_created.connect(add_delay)
+                logging.disable(logging.CRITICAL)
+                try:
+                    for name, (threads, slow_threads) in deployments.items():
+                        cache.clear()
+                        application = AsgiHandler(
+                            WSGIHandler(), threads, slow_threads)
+                        self.report(
+                            name, threads, slow_threads,
+                            load.run(application))
+                        application.executor.shutdown()
+                        application.slow_executor.shutdown()
+                finally:
+                    logging.disable(logging.NOTSET)
+                    connection_created.disconnect(add_delay)
+        finally:
+            teardown_test_environment()
+
+    def prepare(self, options):
+        seed(users=100, groups=5, posts=options['posts'], follows=10,
+             comments=options['posts'])
+        urls = sample_urls(random.Random(0), 10, pages=2)
+        requests = {
+            'fast': [
+                pair for page in ('index', 'group_post', 'profile',
+                                  'post_view')
+                for pair in urls[page]],
+            'slow': urls['follow_index'] + [
+                (f'{url}comments/', user) for url, user in urls['post_view']],
+        }
+        load = AsgiLoad(
+            requests,
+            {'fast': options['fast_clients'],
+             'slow': options['slow_clients']},
+            options['seconds'])
+        connection.close()
+        return load
+
+    def report(self, name, threads, slow_threads, results):
+        pools = (f'{threads} threads' if not slow_threads else
+                 f'{threads} + {slow_threads} slow-view threads')
+        self.stdout.write(f'{name} ({pools}):')
+        for kind in ('fast', 'slow'):
+            stats = results[kind]
+            if not stats['requests']:
+                self.stdout.write(f'  {kind}: none completed')
+                continue
+            self.stdout.write(
+                f'  {kind}: {stats["requests"]} '
+                f'({stats["per_second"]:.1f}/s), '
+                f'p50 {stats["p50"]:.1f} ms, p95 {stats["p95"]:.1f} ms')
+        self.stdout.write(f'  failed requests: {results["errors"]}')
@@ -0,0 +1,84 @@
+import logging
+import random
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts.benchmark import (ConcurrentLoad, sample_urls, scratch_database,
+                             seed)
+
+# Connection settings compared by the benchmark. "stock" is what the
+# plain Django SQLite backend does; "tuned" are the yatube.sqlite defaults.
+PROFILES = {
+    'stock': {
+        'pragmas': {
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'cache_size': -2000,
+            'mmap_size': 0,
+            'temp_store': 'DEFAULT',
+        },
+        'transaction_mode': 'DEFERRED',
+    },
+    'tuned': {},
+}
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent readers and writers against throwaway SQLite '
+            'files with stock and tuned connection settings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument(
+            '--profiles', nargs='+', choices=PROFILES,
+            default=list(PROFILES))
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            for name in options['profiles']:
+                results = self.run(PROFILES[name], options)
+                self.report(name, results)
+        finally:
+            teardown_test_environment()
+
+    def run(self, profile, options):
+        with scratch_database(profile):
+            seed(users=100, groups=5, posts=options['posts'], follows=10,
+                 comments=options['posts'])
+            cache.clear()
+            urls = sample_urls(random.Random(0), 10, pages=2)
+            load = ConcurrentLoad(
+                urls, options['readers'], options['writers'],
+                options['seconds'])
+            connection.close()
+            logging.disable(logging.CRITICAL)
+            try:
+                return load.run()
+            finally:
+                logging.disable(logging.NOTSET)
+
+    def report(self, name, results):
+        self.stdout.write(f'{name}:')
+        for kind in ('read', 'write'):
+            stats = results[kind]
+            if not stats['requests']:
+                self.stdout.write(f'  {kind}s: none completed')
+                continue
+            self.stdout.write(
+                f'  {kind}s: {stats["requests"]} '
+                f'({stats["per_second"]:.1f}/s), '
+                f'p50 {stats["p50"]:.1f} ms, p95 {stats["p95"]:.1f} ms')
+        self.stdout.write(
+            f'  reads overlapping a write: '
+            f'{results["overlapping_reads"]:.0%}')
+        self.stdout.write(f'  failed requests: {results["errors"]}')
+        for kind in results['error_kinds']:
+            self.stdout.write(f'    {kind}')
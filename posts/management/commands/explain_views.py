@@ -0,0 +1,103 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+
+from posts.benchmark import sample_urls, seed
+
+# Plan lines that read a whole table, per database vendor
+FULL_SCANS = {
+    'sqlite': re.compile(
+        r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING (?:COVERING )?INDEX\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+def explain(sql):
+    """Return the plan lines of ``sql`` on the default database."""
+    with connection.cursor() as cursor:
+        cursor.execute(EXPLAIN[connection.vendor] + sql)
+        rows = cursor.fetchall()
+    return [str(row[-1]) for row in rows]
+
+
+def full_scans(plan):
+    pattern = FULL_SCANS[connection.vendor]
+    return [match.group(1) for line in plan
+            for match in [pattern.search(line)] if match]
+
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN on the queries of the main pages and flag '
+            'full table scans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--synthetic', action='store_true',
+            help='Explain against a throwaway database of seeded data '
+                 'instead of the configured one.')
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Print the plan of every query, not only flagged ones.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN:
+            raise CommandError(
+                f'EXPLAIN is not supported on {connection.vendor}.')
+        setup_test_environment()
+        old_name = None
+        if options['synthetic']:
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+        try:
+            if old_name is not None:
+                seed(users=30, groups=3, posts=300, follows=5, comments=300)
+            flagged = self.explain_views(options['verbose_plans'])
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if flagged:
+            raise CommandError(f'Full scans in {flagged} queries.')
+        self.stdout.write('No full scans.')
+
+    def explain_views(self, verbose):
+        try:
+            urls = sample_urls(random.Random(0), 1, pages=2)
+        except IndexError:
+            raise CommandError(
+                'The database needs users, groups, posts and follows; '
+                'use --synthetic to explain against seeded data.')
+        flagged = 0
+        for path, requests in urls.items():
+            statements = []
+            for url, user in requests:
+                client = Client()
+                if user is not None:
+                    client.force_login(user)
+                with CaptureQueriesContext(connection) as captured:
+                    client.get(url)
+                statements += [
+                    query['sql'] for query in captured.captured_queries
+                    if query['sql'].lstrip().upper().startswith('SELECT')]
+
+            self.stdout.write(f'{path}: {len(statements)} queries')
+            for sql in dict.fromkeys(statements):
+                plan = explain(sql)
+                tables = full_scans(plan)
+                if tables:
+                    flagged += 1
+                    self.stdout.write(
+                        f'  FULL SCAN of {", ".join(tables)}: {sql}')
+                if tables or verbose:
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+        return flagged
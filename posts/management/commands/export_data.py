@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FIELDS, FORMATS, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream posts, comments or follows as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=FIELDS)
+        parser.add_argument(
+            '--output', '-o',
+            help='File to write; the standard output by default.')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = export_rows(options['kind'], options['chunk_size'])
+        if options['output'] is None:
+            write_rows(rows, sys.stdout, options['kind'], options['format'])
+            return
+        with open(options['output'], 'w', newline='',
+                  encoding='utf-8') as file:
+            write_rows(rows, file, options['kind'], options['format'])
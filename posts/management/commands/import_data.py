@@ -0,0 +1,64 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import (FIELDS, FORMATS, ImportConflict, Importer,
+                            read_rows)
+
+
+class Command(BaseCommand):
+    help = ('Load posts, comments or follows from NDJSON or CSV in '
+            'batches. Import posts before the comments on them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=FIELDS)
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Create unknown users (inactive) and groups instead of '
+                 'skipping their rows.')
+        parser.add_argument(
+            '--id-map',
+            help='JSON file of exported to new ids, read and updated. Rows '
+                 'whose id is taken get a new one, and comments follow '
+                 'the renumbered posts. Use the same file for both.')
+
+    def handle(self, *args, **options):
+        data_format = options['format'] or (
+            'csv' if os.path.splitext(options['path'])[1] == '.csv'
+            else 'ndjson')
+        id_map = self.read_id_map(options['id_map'])
+        importer = Importer(
+            options['kind'],
+            batch_size=options['batch_size'],
+            create_missing=options['create_missing'],
+            progress=self.stdout.write,
+            id_map=id_map)
+        try:
+            with open(options['path'], newline='',
+                      encoding='utf-8') as file:
+                imported, skipped = importer.run(
+                    read_rows(file, data_format))
+        except ImportConflict as error:
+            raise CommandError(error)
+        finally:
+            if id_map is not None:
+                with open(options['id_map'], 'w') as file:
+                    json.dump(id_map, file)
+        self.stdout.write(
+            f'Imported {options["kind"]}: {imported}, skipped: {skipped}')
+
+    def read_id_map(self, path):
+        if path is None:
+            return None
+        if not os.path.exists(path):
+            return {}
+        with open(path) as file:
+            return {
+                kind: {int(exported): new for exported, new in ids.items()}
+                for kind, ids in json.load(file).items()}
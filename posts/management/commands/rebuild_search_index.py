@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, SearchToken
+from posts.search import index_post, reindex_comments
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the post and comment search index from scratch.'
+
+    def handle(self, *args, **options):
+        SearchToken.objects.all().delete()
+        total = 0
+        for post in Post.objects.only('text').order_by().iterator():
+            index_post(post)
+            reindex_comments(post.pk)
+            total += 1
+        self.stdout.write(f'Indexed posts: {total}')
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import (Count, F, IntegerField, OuterRef, Q,
+                              Subquery)
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post
+from users.models import Profile
+
+User = get_user_model()
+
+
+def count_of(queryset, field, outer='pk'):
+    """Correlated ``COUNT(*)`` of rows whose ``field`` is the outer row."""
+    counts = queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recount stored comment, post and follow counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted rows without fixing them.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+
+        missing = User.objects.filter(profile__isnull=True)
+        self.stdout.write(f'Profiles missing: {missing.count()}')
+        if not self.dry_run:
+            Profile.objects.bulk_create(
+                (Profile(user_id=pk) for pk in
+                 missing.values_list('pk', flat=True).iterator()),
+                batch_size=self.batch_size)
+
+        self.reconcile(
+            Post.objects.annotate(
+                actual_comment_count=count_of(Comment.objects, 'post')),
+            ('comment_count',))
+        self.reconcile(
+            Profile.objects.annotate(
+                actual_posts_count=count_of(
+                    Post.objects, 'author', 'user_id'),
+                actual_followers_count=count_of(
+                    Follow.objects, 'author', 'user_id'),
+                actual_following_count=count_of(
+                    Follow.objects, 'user', 'user_id')),
+            ('posts_count', 'followers_count', 'following_count'))
+
+    def reconcile(self, queryset, fields):
+        drift = Q()
+        for field in fields:
+            drift |= ~Q(**{field: F(f'actual_{field}')})
+        drifted = queryset.filter(drift).order_by().only('pk', *fields)
+
+        batch = []
+        total = 0
+        for obj in drifted.iterator():
+            for field in fields:
+                setattr(obj, field, getattr(obj, f'actual_{field}'))
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                total += self.save(batch, fields)
+                batch = []
+        total += self.save(batch, fields)
+
+        model = queryset.model._meta.verbose_name_plural
+        self.stdout.write(f'Drifted {model}: {total}')
+
+    def save(self, batch, fields):
+        if batch and not self.dry_run:
+            type(batch[0]).objects.bulk_update(batch, fields)
+        return len(batch)
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts.tasks import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when no task is due instead of waiting for more.')
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'TASKS_BATCH', 100),
+            help='Tasks claimed at once.')
+        parser.add_argument(
+            '--sleep', type=float,
+            default=getattr(settings, 'TASKS_POLL', 1),
+            help='Seconds to wait when no task is due.')
+
+    def handle(self, *args, **options):
+        total_ran = total_failed = 0
+        try:
+            while True:
+                close_old_connections()
+                ran, failed = run_pending(options['batch_size'])
+                total_ran += ran
+                total_failed += failed
+                if ran or failed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'Tasks run: {total_ran}, failed: {total_failed}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.notifications import send_digests
+
+
+class Command(BaseCommand):
+    help = ('Email users the digests of new comments and followers that '
+            'are due. Run it periodically, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int,
+            help='Most digests to send; defaults to DIGESTS_PER_RUN.')
+
+    def handle(self, *args, **options):
+        sent = send_digests(options['limit'])
+        self.stdout.write(f'Digests sent: {sent}')
@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.fragments import invalidate_replica
+
+
+class Command(BaseCommand):
+    help = 'Copy the default SQLite database onto every replica file.'
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Only SQLite replicas can be synced here.')
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                connections[alias].close()
+                target = sqlite3.connect(connections[alias].settings_dict[
+                    'NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                invalidate_replica(alias)
+                self.stdout.write(f'Synced {alias}')
+        finally:
+            source.close()
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.6 on 2026-10-18 03:17
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    counts = Comment.objects.order_by().filter(post__isnull=False).values_list(
+        'post').annotate(Count('pk'))
+    for post_id, comment_count in counts.iterator():
+        Post.objects.filter(pk=post_id).update(comment_count=comment_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 2.2.6 on 2026-10-18 03:53
+
+import math
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# The scoring of posts.trending as of this migration, frozen so that
+# later changes to it do not change what this migration does.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = 12
+WEIGHTS = {'post': 1, 'comment': 10}
+BATCH = 500
+
+
+def event_score(kind, when):
+    hours = (when - EPOCH).total_seconds() / 3600
+    return math.log2(WEIGHTS[kind]) + hours / HALF_LIFE
+
+
+def log_add(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def scores(Post, Comment):
+    """Yield ``(post_id, score)`` from one pass over posts and comments.
+
+    Both are read in ``post_id`` order and merged, so memory stays flat.
+    """
+    comments = Comment.objects.filter(post__isnull=False).order_by(
+        'post_id').values_list('post_id', 'created').iterator()
+    comment = next(comments, None)
+    for post_id, pub_date in Post.objects.order_by('pk').values_list(
+            'pk', 'pub_date').iterator():
+        score = event_score('post', pub_date)
+        while comment is not None and comment[0] <= post_id:
+            if comment[0] == post_id:
+                score = log_add(score, event_score('comment', comment[1]))
+            comment = next(comments, None)
+        yield post_id, score
+
+
+def score_posts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    batch = []
+    for post_id, score in scores(Post, Comment):
+        batch.append(Post(pk=post_id, trend_score=score))
+        if len(batch) == BATCH:
+            Post.objects.bulk_update(batch, ['trend_score'])
+            batch = []
+    Post.objects.bulk_update(batch, ['trend_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trend_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trend_score', '-id'], name='post_trend_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-trend_score', '-id'], name='post_group_trend_score_idx'),
+        ),
+        migrations.RunPython(score_posts, migrations.RunPython.noop),
+    ]
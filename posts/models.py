@@ -1,4 +1,5 @@
 import textwrap as tw
+from operator import attrgetter
 
 from django.contrib.auth import get_user_model
 from django.db import models
@@ -15,6 +16,21 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Posts with everything a feed card renders in two queries.
+
+        Author and group are joined in, thumbnails are prefetched, columns
+        no card shows are left out, and the comment and view counts come
+        from the stored ``comment_count`` and ``view_count``.
+        """
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image', 'comment_count', 'view_count',
+            'author', 'group',
+            'author__username', 'group__title', 'group__slug',
+        ).prefetch_related('thumbnails')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -38,9 +54,28 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
         null=True)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    trend_score = models.FloatField(default=0, editable=False)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'),
+            models.Index(
+                fields=('-trend_score', '-id'),
+                name='post_trend_score_idx'),
+            models.Index(
+                fields=('group', '-trend_score', '-id'),
+                name='post_group_trend_score_idx'),
+        )
 
     def __str__(self):
         answer = [
@@ -50,6 +85,24 @@ class Post(models.Model):
             tw.shorten(self.text, 15), ]
         return f'{answer}'
 
+    @property
+    def thumbnail_srcsets(self):
+        """Return ``{format: srcset}`` of the ready thumbnails.
+
+        ``src`` holds the largest JPEG for browsers without ``srcset``;
+        the dict is empty while thumbnails are still being generated.
+        """
+        srcsets = {}
+        thumbnails = sorted(self.thumbnails.all(), key=attrgetter('width'))
+        for thumbnail in thumbnails:
+            srcsets.setdefault(thumbnail.format, []).append(
+                f'{thumbnail.image.url} {thumbnail.width}w')
+            if thumbnail.format == 'jpeg':
+                srcsets['src'] = thumbnail.image.url
+        return {
+            key: value if key == 'src' else ', '.join(value)
+            for key, value in srcsets.items()}
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -74,6 +127,13 @@ class Comment(models.Model):
         'published date',
         auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx'),
+        )
+
     def __str__(self):
         return f'{self.author, tw.shorten(self.text, 15),}'
 
@@ -93,5 +153,138 @@ class Follow(models.Model):
         constraints = (
             models.UniqueConstraint(
                 fields=('author', 'user'),
-                name='unique_follow')
+                name='unique_follow'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'),
+                name='follow_user_author_idx'),
+        )
+
+
+class FeedEntry(models.Model):
+    """Materialized row of a follower's timeline, one per delivered post."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries', )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries', )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+', )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_user_pub_date_idx'),
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx'),
+        )
+
+
+class SearchToken(models.Model):
+    """Inverted index row: how often a word stem occurs in a post."""
+    TOKEN_LENGTH = 64
+
+    token = models.CharField(max_length=TOKEN_LENGTH)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_tokens', )
+    text_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('token', 'post'),
+                name='unique_search_token'),
+        )
+
+
+class Thumbnail(models.Model):
+    """Resized copy of a post image, made by ``posts.thumbnails``."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnails', )
+    size = models.CharField(max_length=20)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    image = models.ImageField(upload_to='posts/thumbnails/')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('post', 'size', 'format'),
+                name='unique_thumbnail'),
+        )
+
+
+class Task(models.Model):
+    """Queued call of a ``posts.tasks`` function, deleted once it ran."""
+    name = models.CharField(max_length=100)
+    args = models.TextField(default='[]')
+    key = models.CharField(max_length=255, unique=True, blank=True,
+                           null=True)
+    run_after = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    failed = models.BooleanField(default=False)
+    claim = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('failed', 'run_after', 'id'),
+                name='task_due_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name}{self.args}'
+
+
+class Notification(models.Model):
+    """New comment or follower waiting for the user's next email digest."""
+    COMMENT = 'comment'
+    FOLLOW = 'follow'
+    KINDS = ((COMMENT, 'Комментарий'), (FOLLOW, 'Подписчик'))
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications', )
+    kind = models.CharField(max_length=10, choices=KINDS)
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+', )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='+', )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('user', 'created'),
+                name='notification_user_idx'),
         )
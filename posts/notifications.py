@@ -0,0 +1,138 @@
+"""Email digests of new comments and followers.
+
+A comment or follow only records a ``Notification`` row in the request.
+``send_digests``, run periodically by ``manage.py send_digests``, mails
+every user with pending notifications one digest of them and deletes
+them. Digests go out ``DIGEST_BATCH`` users at a time, with one query for
+the notifications of the whole batch and one ``EMAIL_BACKEND``
+connection to send all its messages: one SMTP session, or one file with
+the file backend.
+
+A user gets at most one digest every ``DIGEST_INTERVAL`` seconds, which
+lists the ``DIGEST_MAX_ITEMS`` newest notifications and counts the rest;
+notifications arriving in between wait for the next digest. A run sends
+at most ``DIGESTS_PER_RUN`` digests, the rest are sent by the next runs.
+Users who turned ``Profile.email_digests`` off, with the link in every
+digest, or have no email address get none, and their notifications are
+dropped.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import Profile
+
+from .models import Notification
+
+User = get_user_model()
+
+
+def notify_comment(comment):
+    author_id = comment.post.author_id
+    if author_id != comment.author_id:
+        Notification.objects.create(
+            user_id=author_id, kind=Notification.COMMENT,
+            actor_id=comment.author_id, comment=comment)
+
+
+def notify_follow(follow):
+    Notification.objects.create(
+        user_id=follow.author_id, kind=Notification.FOLLOW,
+        actor_id=follow.user_id)
+
+
+def withdraw_follow(follow):
+    Notification.objects.filter(
+        user_id=follow.author_id, kind=Notification.FOLLOW,
+        actor_id=follow.user_id).delete()
+
+
+def drop_undeliverable():
+    Notification.objects.filter(
+        Q(user__profile__email_digests=False) | Q(user__email='')).delete()
+
+
+def due_users(now):
+    interval = timedelta(seconds=getattr(settings, 'DIGEST_INTERVAL', 0))
+    return User.objects.annotate(
+        pending=Exists(Notification.objects.filter(user=OuterRef('pk'))),
+    ).filter(
+        Q(profile__last_digest__isnull=True)
+        | Q(profile__last_digest__lte=now - interval),
+        pending=True, profile__email_digests=True,
+    ).exclude(email='').select_related('profile').order_by('pk')
+
+
+def site_url(path):
+    return getattr(settings, 'SITE_URL', '') + path
+
+
+def digest_message(user, notifications):
+    shown = notifications[:getattr(settings, 'DIGEST_MAX_ITEMS', 20)]
+    unsubscribe_url = site_url(
+        reverse('unsubscribe', args=[user.profile.unsubscribe_token]))
+    body = render_to_string('email/digest.txt', {
+        'user': user,
+        'comments': [
+            (notification, site_url(reverse(
+                'posts:post',
+                args=[user.username, notification.comment.post_id])))
+            for notification in shown
+            if notification.kind == Notification.COMMENT],
+        'followers': [
+            (notification, site_url(reverse(
+                'posts:profile', args=[notification.actor.username])))
+            for notification in shown
+            if notification.kind == Notification.FOLLOW],
+        'more': len(notifications) - len(shown),
+        'unsubscribe_url': unsubscribe_url,
+    })
+    return EmailMessage(
+        'Yatube: новые комментарии и подписчики', body, to=[user.email],
+        headers={
+            'List-Unsubscribe': f'<{unsubscribe_url}>',
+            'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+        })
+
+
+def send_batch(users, now):
+    """Mail the digests of ``users`` over one connection."""
+    pending = defaultdict(list)
+    for notification in Notification.objects.filter(
+            user__in=users).select_related('actor', 'comment').order_by(
+            '-created', '-pk'):
+        pending[notification.user_id].append(notification)
+    users = [user for user in users if pending[user.pk]]
+    with get_connection() as connection:
+        connection.send_messages(
+            [digest_message(user, pending[user.pk]) for user in users])
+    with transaction.atomic():
+        Notification.objects.filter(pk__in=[
+            notification.pk for user in users
+            for notification in pending[user.pk]]).delete()
+        Profile.objects.filter(user__in=users).update(last_digest=now)
+    return len(users)
+
+
+def send_digests(limit=None, now=None):
+    """Send the digests that are due; return how many were sent."""
+    now = now or timezone.now()
+    limit = limit or getattr(settings, 'DIGESTS_PER_RUN', None)
+    batch_size = getattr(settings, 'DIGEST_BATCH', 100)
+    drop_undeliverable()
+    sent = 0
+    while limit is None or sent < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sent)
+        users = list(due_users(now)[:size])
+        if not users:
+            break
+        sent += send_batch(users, now)
+    return sent
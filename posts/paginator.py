@@ -0,0 +1,136 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, key):
+    date, pk = key
+    raw = f'{direction}|{date.isoformat()}|{pk}'
+    token = base64.urlsafe_b64encode(raw.encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(direction, date, pk)`` or ``None`` for a bad token."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, date, pk = raw.split('|')
+        date = parse_datetime(date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or date is None:
+        return None
+    return direction, date, pk
+
+
+class CursorPage(Page):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(NEXT, self.paginator.key(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(
+            PREVIOUS, self.paginator.key(self.object_list[0]))
+
+
+class CursorPaginator(Paginator):
+    """Keyset paginator over ``(pub_date, id)`` of newest-first posts.
+
+    Pages are addressed by opaque cursors instead of numbers, so each page
+    is a single range query on ``pub_date`` without OFFSET or COUNT(*).
+    """
+    key_fields = ('pub_date', 'pk')
+    key_date = 'pub_date'
+    newest_first = True
+
+    def __init__(self, object_list, per_page):
+        order = '-' if self.newest_first else ''
+        super().__init__(
+            object_list.order_by(
+                *(f'{order}{field}' for field in self.key_fields)),
+            per_page)
+
+    def key(self, obj):
+        """Return the ``(date, pk)`` key of a row, as stored in cursors.
+
+        Rows are model instances, or ``.values()`` dicts holding ``id`` and
+        the ``key_date`` column.
+        """
+        if isinstance(obj, dict):
+            return obj[self.key_date], obj['id']
+        return getattr(obj, self.key_date), obj.pk
+
+    def page_rows(self, page):
+        """Return a lazy queryset of just the rows of ``page``."""
+        return self.object_list.filter(
+            pk__in=[self.key(obj)[1] for obj in page])
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            rows = self._query(NEXT, None)
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], self, has_next, False)
+        direction, date, pk = decoded
+        rows = self._query(direction, (date, pk))
+        if direction == NEXT:
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], self, has_next, True)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(rows, self, True, has_previous)
+
+    def _where(self, direction, key):
+        """Return the ``Q`` selecting rows strictly past ``key``."""
+        if key is None:
+            return Q()
+        date_field, pk_field = self.key_fields
+        date, pk = key
+        lookup = 'lt' if (direction == NEXT) == self.newest_first else 'gt'
+        return (
+            Q(**{f'{date_field}__{lookup}': date})
+            | Q(**{date_field: date, f'{pk_field}__{lookup}': pk}))
+
+    def _query(self, direction, key):
+        """Return up to ``per_page + 1`` rows past ``key``.
+
+        Rows come in page order for ``NEXT`` and reversed for
+        ``PREVIOUS``.
+        """
+        queryset = self.object_list.filter(self._where(direction, key))
+        if direction == PREVIOUS:
+            queryset = queryset.reverse()
+        return list(queryset[:self.per_page + 1])
+
+
+class CommentPaginator(CursorPaginator):
+    """Keyset paginator over ``(created, id)`` of oldest-first comments."""
+    key_fields = ('created', 'pk')
+    key_date = 'created'
+    newest_first = False
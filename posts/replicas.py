@@ -0,0 +1,74 @@
+"""Routing of read-only page views to database replicas.
+
+``ReplicaMiddleware`` picks one of ``DATABASE_REPLICAS`` for GET requests
+to the views in ``REPLICA_VIEWS`` and ``ReplicaRouter`` sends the reads of
+app models made during that request to it. Everything else, including
+sessions and the database cache, stays on ``default``. A client that has
+just written is pinned to the primary for ``REPLICA_PIN_SECONDS`` by a
+cookie, so it reads its own writes while replicas catch up.
+
+Other clients may read a replica that lags behind a write. Fragment
+cache keys and ETags include the replica's position (see
+``posts.fragments.read_version``), which ``sync_replicas`` advances, so
+what they render is not served to readers of the primary or of a newer
+copy.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+REPLICATED_APPS = ('auth', 'posts', 'users')
+
+current_replica = ContextVar('current_replica', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICATED_APPS:
+            return current_replica.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.database = 'default'
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, '_replica_token', None)
+            if token is not None:
+                current_replica.reset(token)
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or request.method not in ('GET', 'HEAD')
+                or PIN_COOKIE in request.COOKIES
+                or request.resolver_match.view_name
+                not in settings.REPLICA_VIEWS):
+            return None
+        request.database = random.choice(replicas)
+        request._replica_token = current_replica.set(request.database)
+        return None
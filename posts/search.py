@@ -0,0 +1,180 @@
+"""Inverted index over post and comment text.
+
+Every post has one ``SearchToken`` row per distinct word stem found in its
+text or in its comments. Words are lower-cased, ``ё`` is folded into
+``е`` and Cyrillic words are reduced with the Snowball Russian stemmer,
+so "комментарии" finds "комментарий". Posts are ranked by how often the
+query stems occur, with hits in the post text counting
+``search_text_weight`` times as much as hits in comments. Saved posts
+are indexed by ``posts.tasks`` workers; comments adjust the counts of
+their post in place, which a retry would repeat, so they are indexed in
+the request.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .constants import search_text_weight
+from .models import Comment, Post, SearchToken
+from .tasks import task
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'[а-я]')
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(
+    r'(ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(в|вши|вшись))$')
+REFLEXIVE = re.compile(r'(ся|сь)$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'(ивш|ывш|ующ|(?<=[ая])(ем|нн|вш|ющ|щ))$')
+VERB = re.compile(
+    r'(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено'
+    r'|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю'
+    r'|(?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$')
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем'
+    r'|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(r'(ость|ост)$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'был', 'была', 'были', 'было', 'в', 'во', 'вот',
+    'все', 'вы', 'да', 'для', 'до', 'его', 'ее', 'если', 'же', 'за', 'и',
+    'из', 'или', 'им', 'их', 'к', 'как', 'ко', 'ли', 'мне', 'мы', 'на',
+    'не', 'нет', 'но', 'о', 'об', 'он', 'она', 'они', 'оно', 'от', 'по',
+    'при', 'с', 'со', 'так', 'то', 'ты', 'у', 'что', 'это', 'я',
+))
+
+
+def _region(word, start=0):
+    """Return the index after the first non-vowel that follows a vowel."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Reduce a lower-case Russian word with the Snowball algorithm."""
+    rv_start = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS),
+        len(word))
+    r2_start = _region(word, _region(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    rv, removed = PERFECTIVE_GERUND.subn('', rv, 1)
+    if not removed:
+        rv = REFLEXIVE.sub('', rv, 1)
+        rv, removed = ADJECTIVE.subn('', rv, 1)
+        if removed:
+            rv = PARTICIPLE.sub('', rv, 1)
+        else:
+            rv, removed = VERB.subn('', rv, 1)
+            if not removed:
+                rv = NOUN.sub('', rv, 1)
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    match = DERIVATIONAL.search(rv)
+    if match and rv_start + match.start() >= r2_start:
+        rv = rv[:match.start()]
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv, removed = SUPERLATIVE.subn('', rv, 1)
+        if removed and rv.endswith('нн'):
+            rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    """Return the index stems of ``text`` in order, stop words dropped."""
+    tokens = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        if CYRILLIC.search(word):
+            word = stem(word)
+        tokens.append(word[:SearchToken.TOKEN_LENGTH])
+    return tokens
+
+
+def _adjust(post_id, field, counts):
+    """Add ``counts`` (stem -> delta) to ``field`` of the post's tokens."""
+    with transaction.atomic():
+        rows = {
+            row.token: row for row in SearchToken.objects.filter(
+                post_id=post_id, token__in=counts)}
+        new = []
+        for token, delta in counts.items():
+            row = rows.get(token)
+            if row is not None:
+                setattr(row, field, max(getattr(row, field) + delta, 0))
+            elif delta > 0:
+                new.append(SearchToken(
+                    post_id=post_id, token=token, **{field: delta}))
+        SearchToken.objects.bulk_update(rows.values(), (field,))
+        SearchToken.objects.bulk_create(new)
+        SearchToken.objects.filter(
+            post_id=post_id, text_count=0, comment_count=0).delete()
+
+
+def index_post(post):
+    SearchToken.objects.filter(post=post).update(text_count=0)
+    _adjust(post.pk, 'text_count', Counter(tokenize(post.text)))
+
+
+@task(batch=True)
+def index_posts(calls):
+    """Reindex the text of the posts of ``(post_id,)`` calls."""
+    for post in Post.objects.filter(
+            pk__in=[post_id for post_id, in calls]).only('text'):
+        index_post(post)
+
+
+def index_new_posts(posts):
+    """Index the text of posts that have no tokens yet, in one insert."""
+    SearchToken.objects.bulk_create(
+        SearchToken(post_id=post.pk, token=token, text_count=count)
+        for post in posts
+        for token, count in Counter(tokenize(post.text)).items())
+
+
+def index_comment(comment, sign=1):
+    counts = Counter(tokenize(comment.text))
+    _adjust(comment.post_id, 'comment_count', {
+        token: sign * count for token, count in counts.items()})
+
+
+def reindex_comments(post_id):
+    SearchToken.objects.filter(post_id=post_id).update(comment_count=0)
+    counts = Counter()
+    for text in Comment.objects.filter(post_id=post_id).values_list(
+            'text', flat=True).iterator():
+        counts.update(tokenize(text))
+    _adjust(post_id, 'comment_count', counts)
+
+
+def find_posts(query):
+    """Return feed posts matching every stem of ``query``, best first."""
+    tokens = set(tokenize(query))
+    if not tokens:
+        return Post.objects.none()
+    return Post.objects.for_feed().filter(
+        search_tokens__token__in=tokens,
+    ).annotate(
+        matched=Count('search_tokens'),
+        score=Sum(
+            F('search_tokens__text_count') * search_text_weight
+            + F('search_tokens__comment_count')),
+    ).filter(matched=len(tokens)).order_by('-score', '-pub_date', '-pk')
@@ -0,0 +1,217 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import Profile
+
+from .events import publish_follow, publish_post
+from .feed import (deliver_followed_posts, deliver_posts,
+                   remove_unfollowed_posts)
+from .fragments import invalidate_group, invalidate_post, invalidate_profile
+from .models import Comment, Follow, Group, Post
+from .notifications import notify_comment, notify_follow, withdraw_follow
+from .search import index_comment, index_posts, reindex_comments
+from .trending import initial_score, record_comment
+
+
+def bump(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Post)
+def deliver_post(sender, instance, created, **kwargs):
+    if created:
+        deliver_posts.delay(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def deliver_follow(sender, instance, created, **kwargs):
+    if created:
+        deliver_followed_posts.delay(
+            instance.user_id, instance.author_id,
+            key=f'follow:{instance.user_id}:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def deliver_unfollow(sender, instance, **kwargs):
+    remove_unfollowed_posts.delay(
+        instance.user_id, instance.author_id,
+        key=f'unfollow:{instance.user_id}:{instance.author_id}')
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        bump(Profile.objects.filter(user_id=instance.author_id),
+             'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    bump(Profile.objects.filter(user_id=instance.author_id),
+         'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        bump(Post.objects.filter(pk=instance.post_id), 'comment_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    bump(Post.objects.filter(pk=instance.post_id), 'comment_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        bump(Profile.objects.filter(user_id=instance.author_id),
+             'followers_count', 1)
+        bump(Profile.objects.filter(user_id=instance.user_id),
+             'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    bump(Profile.objects.filter(user_id=instance.author_id),
+         'followers_count', -1)
+    bump(Profile.objects.filter(user_id=instance.user_id),
+         'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_fragments(sender, instance, **kwargs):
+    invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_fragments(sender, instance, **kwargs):
+    if instance.post_id is None:
+        return
+    invalidate_post(instance.post_id)
+    if Comment.post.is_cached(instance):
+        post = instance.post
+    else:
+        post = Post.objects.filter(pk=instance.post_id).only(
+            'author', 'group').first()
+    if post is not None:
+        invalidate_post_pages(post)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, **kwargs):
+    instance._old_group_id = None if instance._state.adding else (
+        Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', flat=True).first())
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_author_profile(sender, instance, **kwargs):
+    invalidate_post_pages(instance)
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id not in (None, instance.group_id):
+        invalidate_group(old_group_id)
+
+
+def invalidate_post_pages(post):
+    """Change the profile and group ETags of the pages showing ``post``."""
+    invalidate_profile(post.author_id)
+    if post.group_id is not None:
+        invalidate_group(post.group_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+    invalidate_profile(instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_page(sender, instance, **kwargs):
+    invalidate_group(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, **kwargs):
+    index_posts.delay(instance.pk, key=f'index:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+def index_comment_text(sender, instance, created, **kwargs):
+    if instance.post_id is None:
+        return
+    if created:
+        index_comment(instance)
+    else:
+        reindex_comments(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment_text(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        index_comment(instance, -1)
+
+
+@receiver(post_save, sender=Post)
+def score_new_post(sender, instance, created, **kwargs):
+    if created:
+        instance.trend_score = initial_score(instance)
+        Post.objects.filter(pk=instance.pk).update(
+            trend_score=instance.trend_score)
+
+
+@receiver(post_save, sender=Comment)
+def score_new_comment(sender, instance, created, **kwargs):
+    if created and instance.post_id is not None:
+        record_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unscore_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        record_comment(instance, remove=True)
+
+
+@receiver(post_save, sender=Post)
+def announce_new_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_post(instance))
+
+
+@receiver(post_save, sender=Follow)
+def announce_follow(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_follow(
+            instance.user_id, instance.author_id, True))
+
+
+@receiver(post_delete, sender=Follow)
+def announce_unfollow(sender, instance, **kwargs):
+    transaction.on_commit(lambda: publish_follow(
+        instance.user_id, instance.author_id, False))
+
+
+@receiver(post_save, sender=Comment)
+def notify_post_author(sender, instance, created, **kwargs):
+    if created and instance.post_id is not None:
+        notify_comment(instance)
+
+
+@receiver(post_save, sender=Follow)
+def notify_followed_author(sender, instance, created, **kwargs):
+    if created:
+        notify_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def withdraw_follow_notification(sender, instance, **kwargs):
+    withdraw_follow(instance)
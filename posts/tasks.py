@@ -0,0 +1,234 @@
+"""Queued side effects of writes.
+
+Functions decorated with ``task`` run in ``manage.py run_tasks`` workers
+instead of the request: ``function.delay(*args)`` inserts a ``Task`` row
+in the transaction of the write, so the request pays for one insert and
+a task exists exactly when the write was committed. Arguments are stored
+as JSON and are normally primary keys, so workers act on current rows.
+
+``key`` makes a waiting call idempotent: a call with the key of a task
+that is still pending is dropped. Workers release the key when they
+claim a task, so a call made while it runs is queued again. Tasks run
+outside of a transaction: with SQLite a transaction holds the database
+write lock, which web requests would wait for during slow work such as
+resizing images. A task that writes several rows does so in
+``task_transaction()``, which also deletes its ``Task`` row, so the
+writes and the completion commit together; other tasks are deleted once
+they return. A worker that dies leaves its claims to others after
+``TASKS_LEASE`` seconds, so tasks run at least once and must be safe to
+repeat.
+
+A failing task is retried ``retries`` times, ``TASKS_RETRY_DELAY``
+seconds later and twice as long after each further attempt, and is then
+kept with ``failed`` set and its traceback for the admin. A ``batch``
+function is called once with the list of argument lists of all claimed
+calls, e.g. to fan out a hundred new posts with one query per table.
+
+With ``TASKS_EAGER``, the default in development, ``delay`` calls the
+function right away, as the signals did before, except for
+``background`` tasks: those wait for the commit and, in a request, for
+the response to be sent, so slow work does not delay the response even
+without a worker. ``BackgroundTasksMiddleware`` collects them while the
+view runs and hands them to the response, which makes them when it is
+closed, on whichever thread the server closes it.
+"""
+import json
+import logging
+import threading
+import traceback
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+running = threading.local()
+# background calls of the request being handled, made once it is closed
+deferred = ContextVar('deferred', default=None)
+
+
+class TaskFunction:
+    def __init__(self, function, retries, batch, background):
+        self.function = function
+        self.name = f'{function.__module__}.{function.__qualname__}'
+        self.retries = retries
+        self.batch = batch
+        self.background = background
+        self.__doc__ = function.__doc__
+        registry[self.name] = self
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+    def delay(self, *args, key=None):
+        """Queue a call, or make it now under ``TASKS_EAGER``."""
+        if not getattr(settings, 'TASKS_EAGER', False):
+            enqueue(self.name, args, key)
+            return
+        calls = [json.loads(json.dumps(args))]
+        if self.background:
+            transaction.on_commit(lambda: run_after_response(self, calls))
+        else:
+            self.run(calls)
+
+    def run(self, calls):
+        if self.batch:
+            self.function(calls)
+        else:
+            for args in calls:
+                self.function(*args)
+
+
+def task(retries=3, batch=False, background=False):
+    def decorator(function):
+        return TaskFunction(function, retries, batch, background)
+    return decorator
+
+
+def run_after_response(function, calls):
+    pending = deferred.get()
+    if pending is None:
+        run_eagerly(function, calls)
+    else:
+        pending.append((function, calls))
+
+
+def run_eagerly(function, calls):
+    try:
+        function.run(calls)
+    except Exception:
+        logger.exception('Task %s failed', function.name)
+
+
+class DeferredCalls(list):
+    """Background calls of a response, made by ``HttpResponse.close``."""
+
+    def close(self):
+        for function, calls in self:
+            run_eagerly(function, calls)
+        self.clear()
+
+
+class BackgroundTasksMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pending = DeferredCalls()
+        token = deferred.set(pending)
+        try:
+            response = self.get_response(request)
+        finally:
+            deferred.reset(token)
+        if pending:
+            response._closable_objects.append(pending)
+        return response
+
+
+@contextmanager
+def task_transaction():
+    """Transaction for the writes of a task that also completes it.
+
+    The ``Task`` rows being run are deleted in it, so a worker that dies
+    later does not make the writes again. Slow work belongs before it.
+    """
+    with transaction.atomic():
+        yield
+        ids = getattr(running, 'ids', None)
+        if ids:
+            Task.objects.filter(pk__in=ids).delete()
+            running.ids = None
+
+
+def enqueue(name, args=(), key=None):
+    Task.objects.bulk_create(
+        [Task(name=name, args=json.dumps(args), key=key,
+              run_after=timezone.now())],
+        ignore_conflicts=True)
+
+
+def claim(limit):
+    """Lease up to ``limit`` due tasks to the caller, oldest first."""
+    now = timezone.now()
+    due = Task.objects.filter(failed=False, run_after__lte=now).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+    ids = list(due.order_by('run_after', 'id').values_list(
+        'pk', flat=True)[:limit])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    due.filter(pk__in=ids).update(
+        claim=token, key=None,
+        locked_until=now + timedelta(
+            seconds=getattr(settings, 'TASKS_LEASE', 300)))
+    return list(Task.objects.filter(pk__in=ids, claim=token).order_by('pk'))
+
+
+def run_pending(limit=None):
+    """Claim and run due tasks; return how many ran and how many failed.
+
+    Tasks of one ``batch`` function are run with a single call.
+    """
+    tasks = claim(limit or getattr(settings, 'TASKS_BATCH', 100))
+    groups = defaultdict(list)
+    for queued in tasks:
+        groups[queued.name].append(queued)
+    ran = failed = 0
+    for name, group in groups.items():
+        function = registry.get(name)
+        if function is None:
+            give_up(group, f'Unknown task {name}')
+            failed += len(group)
+            continue
+        for part in [group] if function.batch else [[t] for t in group]:
+            if execute(function, part):
+                ran += len(part)
+            else:
+                failed += len(part)
+    return ran, failed
+
+
+def execute(function, tasks):
+    running.ids = [queued.pk for queued in tasks]
+    try:
+        function.run([json.loads(queued.args) for queued in tasks])
+        if running.ids:
+            Task.objects.filter(pk__in=running.ids).delete()
+    except Exception:
+        logger.exception('Task %s failed', function.name)
+        retry(function, tasks, traceback.format_exc())
+        return False
+    finally:
+        running.ids = None
+    return True
+
+
+def retry(function, tasks, error):
+    now = timezone.now()
+    delay = getattr(settings, 'TASKS_RETRY_DELAY', 10)
+    for queued in tasks:
+        queued.attempts += 1
+        queued.failed = queued.attempts > function.retries
+        queued.run_after = now + timedelta(
+            seconds=delay * 2 ** (queued.attempts - 1))
+        queued.error = error
+        queued.claim = ''
+        queued.locked_until = None
+    Task.objects.bulk_update(tasks, (
+        'attempts', 'failed', 'run_after', 'error', 'claim',
+        'locked_until'))
+
+
+def give_up(tasks, error):
+    Task.objects.filter(pk__in=[queued.pk for queued in tasks]).update(
+        failed=True, error=error, claim='', locked_until=None)
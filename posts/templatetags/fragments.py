@@ -0,0 +1,25 @@
+from django import template
+
+from posts import fragments
+
+register = template.Library()
+
+
+@register.simple_tag
+def feed_version():
+    return fragments.feed_version()
+
+
+@register.simple_tag
+def read_version():
+    return fragments.read_version()
+
+
+@register.simple_tag
+def post_version(post):
+    return fragments.post_version(post.pk)
+
+
+@register.filter
+def owned_by(post, user):
+    return post.author_id == user.pk
@@ -0,0 +1,179 @@
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.constants import page_amount
+from posts.models import Comment, Follow, Group, Post
+from posts.viewcounts import view_counter
+
+User = get_user_model()
+
+
+class ApiReadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}',
+                group=cls.group if i % 2 else None)
+            for i in range(page_amount + 2)]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def get(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_index_pages_with_cursors(self):
+        first = self.get('api:index')
+        self.assertEqual(len(first['results']), page_amount)
+        self.assertEqual(first['results'][0]['id'], self.posts[-1].pk)
+        self.assertEqual(first['results'][0]['author'], 'AnnaY')
+        second = self.get('api:index', cursor=first['next_cursor'])
+        self.assertEqual(
+            [post['id'] for post in second['results']],
+            [post.pk for post in self.posts[1::-1]])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_lists_read_only_the_columns_they_need(self):
+        with self.assertNumQueries(1):
+            data = self.get('api:index', fields='id,text')
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('api:index'), {'fields': 'sql'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['fields'], ['sql'])
+
+    def test_group_profile_and_follow_feeds(self):
+        group = self.get('api:group', self.group.slug)
+        self.assertTrue(all(
+            post['group'] == self.group.slug for post in group['results']))
+        profile = self.get('api:profile', self.author.username)
+        self.assertEqual(profile['author']['posts_count'], len(self.posts))
+        self.assertFalse(profile['author']['following'])
+
+        self.assertEqual(
+            self.client.get(reverse('api:follow_index')).status_code, 401)
+        self.client.force_login(self.reader)
+        feed = self.get('api:follow_index')
+        self.assertEqual(feed['results'][0]['id'], self.posts[-1].pk)
+
+    def test_post_and_comments(self):
+        post = self.posts[0]
+        data = self.get('api:post', self.author.username, post.pk)
+        self.assertEqual(data['comment_count'], 1)
+        self.assertIsNone(data['image'])
+        comments = self.get('api:comments', self.author.username, post.pk)
+        self.assertEqual(comments['results'][0]['text'], 'Комментарий')
+        response = self.client.get(
+            reverse('api:post', args=[self.reader.username, post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_revalidated_posts_are_counted(self):
+        post = self.posts[1]
+        url = reverse('api:post', args=[self.author.username, post.pk])
+        view_counter.flush()
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(view_counter.pending(post.pk), 2)
+        view_counter.flush()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).json()[
+                'view_count'], 2)
+
+    def test_profile_etag_ignores_other_authors(self):
+        url = reverse('api:profile', args=[self.author.username])
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.reader, text='Другой пост')
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_responses_are_gzipped_on_request(self):
+        response = self.client.get(
+            reverse('api:index'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), page_amount)
+
+
+class ApiWriteTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def post_json(self, name, args=(), data=None):
+        return self.client.post(
+            reverse(name, args=args), json.dumps(data or {}),
+            content_type='application/json')
+
+    def test_writes_need_a_user(self):
+        response = self.post_json('api:new_post', data={'text': 'Новый'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            self.client.get(reverse('api:new_post')).status_code, 405)
+
+    def test_new_post_edit_and_validation(self):
+        self.client.force_login(self.author)
+        response = self.post_json('api:new_post', data={'text': 'Новый'})
+        self.assertEqual(response.status_code, 201)
+        post_id = response.json()['id']
+        response = self.post_json(
+            'api:post_edit', [self.author.username, post_id],
+            {'text': 'Исправленный'})
+        self.assertEqual(response.json()['text'], 'Исправленный')
+        response = self.post_json('api:new_post', data={'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_csrf_failures_are_json(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = client.post(
+            reverse('api:new_post'), json.dumps({'text': 'Новый'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['error'], 'CSRF verification failed')
+        response = client.post(reverse('posts:new_post'), {'text': 'Новый'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'text/html')
+
+    def test_only_the_author_edits(self):
+        self.client.force_login(self.reader)
+        response = self.post_json(
+            'api:post_edit', [self.author.username, self.post.pk],
+            {'text': 'Чужой'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_comment_follow_and_unfollow(self):
+        self.client.force_login(self.reader)
+        response = self.post_json(
+            'api:comments', [self.author.username, self.post.pk],
+            {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author'], 'reader')
+        self.assertEqual(self.post.comments.count(), 1)
+
+        response = self.post_json(
+            'api:profile_follow', [self.author.username])
+        self.assertTrue(response.json()['following'])
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        self.post_json('api:profile_unfollow', [self.author.username])
+        self.assertFalse(Follow.objects.exists())
+        response = self.post_json(
+            'api:profile_follow', [self.reader.username])
+        self.assertEqual(response.status_code, 400)
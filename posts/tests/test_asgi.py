@@ -0,0 +1,171 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import path, reverse
+
+from posts.tasks import run_after_response, task
+from yatube.asgi import AsgiHandler
+
+remembered = []
+
+
+@task(background=True)
+def remember(number):
+    remembered.append(number)
+
+
+def background_view(request, number):
+    run_after_response(remember, [[number]])
+    return HttpResponse(str(number))
+
+
+urlpatterns = [path('background/<int:number>/', background_view)]
+
+
+class Response(list):
+    closed = False
+    closed_in = None
+
+    def close(self):
+        self.closed = True
+        self.closed_in = threading.current_thread().name
+
+
+class StreamingResponse(Response):
+    streaming = True
+
+
+def call(application, scope, body=b''):
+    return asyncio.run(exchange(application, scope, body))
+
+
+async def exchange(application, scope, body=b''):
+    messages = [
+        {'type': 'http.request', 'body': body[:3], 'more_body': True},
+        {'type': 'http.request', 'body': body[3:]},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    return sent
+
+
+def http_scope(path, method='GET', query=b'', headers=()):
+    return {'type': 'http', 'method': method, 'path': path,
+            'query_string': query, 'headers': list(headers)}
+
+
+class AsgiHandlerTest(SimpleTestCase):
+    def setUp(self):
+        self.environ = None
+        self.threads = []
+        self.response = Response([b'Hello, ', b'', b'world'])
+
+    def wsgi(self, environ, start_response):
+        self.environ = environ
+        self.body = environ['wsgi.input'].read()
+        self.threads.append(threading.current_thread().name)
+        start_response('201 Created', [('Content-Type', 'text/plain')])
+        return self.response
+
+    def test_requests_are_translated_to_wsgi(self):
+        sent = call(
+            AsgiHandler(self.wsgi, 2, 1),
+            http_scope('/new/', 'POST', b'a=1', [
+                (b'content-type', b'application/json'),
+                (b'x-tag', b'one'), (b'x-tag', b'two')]),
+            b'{"text": 1}')
+        self.assertEqual(self.environ['REQUEST_METHOD'], 'POST')
+        self.assertEqual(self.environ['PATH_INFO'], '/new/')
+        self.assertEqual(self.environ['QUERY_STRING'], 'a=1')
+        self.assertEqual(self.environ['CONTENT_TYPE'], 'application/json')
+        self.assertEqual(self.environ['HTTP_X_TAG'], 'one,two')
+        self.assertEqual(self.body, b'{"text": 1}')
+
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertEqual(sent[0]['headers'],
+                         [(b'content-type', b'text/plain')])
+        self.assertEqual(b''.join(message.get('body', b'')
+                                  for message in sent[1:]),
+                         b'Hello, world')
+        self.assertFalse(sent[-1].get('more_body', False))
+        self.assertTrue(self.response.closed)
+
+    def test_responses_are_closed_by_the_thread_that_made_them(self):
+        call(AsgiHandler(self.wsgi, 4, 0), http_scope('/'))
+        self.assertEqual(self.response.closed_in, self.threads[0])
+
+    def test_streams_are_sent_chunk_by_chunk(self):
+        self.response = StreamingResponse([b'one', b'two'])
+        sent = call(AsgiHandler(self.wsgi, 2, 0), http_scope('/'))
+        self.assertEqual(
+            [message.get('body') for message in sent[1:]],
+            [b'one', b'two', b''])
+        self.assertTrue(self.response.closed)
+
+    def test_slow_views_get_their_own_pool(self):
+        application = AsgiHandler(self.wsgi, 2, 1)
+        call(application, http_scope(reverse('posts:follow_index')))
+        call(application, http_scope(reverse('posts:index')))
+        call(application, http_scope('/missing/path/'))
+        self.assertEqual(
+            [name.split('_')[0] for name in self.threads],
+            ['asgi-slow', 'asgi', 'asgi'])
+
+        shared = AsgiHandler(self.wsgi, 2, 0)
+        self.assertIs(shared.slow_executor, shared.executor)
+
+    def test_lifespan_runs_the_view_count_flusher(self):
+        messages = [{'type': 'lifespan.startup'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+            if message['type'] == 'lifespan.startup.complete':
+                messages.append({'type': 'lifespan.shutdown'})
+
+        with mock.patch('posts.viewcounts.view_counter.flush') as flush, \
+                mock.patch('posts.viewcounts.view_counter.start') as start:
+            asyncio.run(AsgiHandler(self.wsgi, 1, 0)(
+                {'type': 'lifespan'}, receive, send))
+        start.assert_called_once_with()
+        flush.assert_called_once_with()
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_background_calls_run_once_after_their_response(self):
+        remembered.clear()
+        application = AsgiHandler(WSGIHandler(), 3, 0)
+
+        async def requests():
+            return await asyncio.gather(*(
+                exchange(application, http_scope(
+                    f'/background/{number}/',
+                    headers=[(b'host', b'localhost')]))
+                for number in range(6)))
+
+        for sent in asyncio.run(requests()):
+            self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(sorted(remembered), list(range(6)))
+
+    def test_django_pages_are_served(self):
+        sent = call(AsgiHandler(WSGIHandler(), 1, 0),
+                    http_scope(reverse('about:author'),
+                               headers=[(b'host', b'localhost')]))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(b'<html', b''.join(
+            message.get('body', b'') for message in sent[1:]))
@@ -0,0 +1,42 @@
+import random
+
+from django.test import TestCase
+
+from posts.benchmark import (PATHS, compare, measure, overlapping_share,
+                             sample_urls, seed)
+from posts.models import FeedEntry, Post
+from users.models import Profile
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        seed(users=10, groups=2, posts=40, follows=3, comments=30)
+
+    def test_seed_builds_feeds_and_counters(self):
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertEqual(
+            sum(Profile.objects.values_list('posts_count', flat=True)), 40)
+
+    def test_measure_reports_every_path(self):
+        results = measure(sample_urls(random.Random(0), 2, pages=2))
+        self.assertEqual(set(results), set(PATHS))
+        for stats in results.values():
+            self.assertLessEqual(stats['p50'], stats['p99'])
+            self.assertGreater(stats['max_queries'], 0)
+
+    def test_compare_flags_slower_and_chattier_paths(self):
+        baseline = {'index': {'p95': 10.0, 'max_queries': 3}}
+        self.assertEqual(
+            compare({'index': {'p95': 11.0, 'max_queries': 3}},
+                    baseline, 0.2), [])
+        self.assertEqual(
+            len(compare({'index': {'p95': 13.0, 'max_queries': 4}},
+                        baseline, 0.2)), 2)
+
+    def test_overlapping_reads_share(self):
+        writes = [(1.0, 2.0), (5.0, 6.0)]
+        reads = [(0.0, 1.5), (2.5, 3.0), (5.5, 7.0), (8.0, 9.0)]
+        self.assertEqual(overlapping_share(reads, writes), 0.5)
@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts.caching import CacheNamespace
+
+
+class CacheNamespaceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.namespace = CacheNamespace('test')
+        self.compute = mock.Mock(return_value='fresh')
+
+    def test_namespaces_and_versions_do_not_collide(self):
+        self.namespace.set('key', 'value')
+        self.assertIsNone(CacheNamespace('other').get('key'))
+        self.assertIsNone(CacheNamespace('test', version=2).get('key'))
+        self.assertEqual(self.namespace.get('key'), 'value')
+
+    def test_value_is_computed_once(self):
+        for _ in range(3):
+            self.assertEqual(
+                self.namespace.get_or_compute('key', self.compute, 60),
+                'fresh')
+        self.compute.assert_called_once()
+
+    def test_stale_value_is_served_while_locked(self):
+        self.namespace.set('key', (0, 'stale'))
+        self.namespace.add('key:lock', True)
+        self.assertEqual(
+            self.namespace.get_or_compute('key', self.compute, 60), 'stale')
+        self.compute.assert_not_called()
+
+    def test_stale_value_is_refreshed_by_lock_holder(self):
+        self.namespace.set('key', (0, 'stale'))
+        self.assertEqual(
+            self.namespace.get_or_compute('key', self.compute, 60), 'fresh')
+        self.assertIsNone(self.namespace.get('key:lock'))
@@ -0,0 +1,20 @@
+from django.db import connection
+from django.test import SimpleTestCase
+
+
+class TunedSQLiteTest(SimpleTestCase):
+    databases = {'default'}
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connections_get_the_pragmas(self):
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+
+    def test_reused_connections_are_checked(self):
+        connection.ensure_connection()
+        self.assertTrue(connection.is_usable())
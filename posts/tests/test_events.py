@@ -0,0 +1,157 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import events
+from posts.events import (LocalBroker, author_channel, follow_stream,
+                          publish_post)
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class LocalBrokerTest(TestCase):
+    def test_messages_from_threads_reach_subscribers(self):
+        broker = LocalBroker()
+
+        async def scenario():
+            subscription = broker.subscribe(['a', 'b'])
+            publisher = threading.Thread(
+                target=broker.publish, args=('b', 'hello'))
+            publisher.start()
+            message = await asyncio.wait_for(subscription.get(), 1)
+            publisher.join()
+            subscription.remove('b')
+            broker.publish('b', 'lost')
+            subscription.close()
+            return message, subscription.queue.qsize()
+
+        self.assertEqual(asyncio.run(scenario()), ('hello', 0))
+        self.assertFalse(broker.channels)
+
+    def test_full_queues_are_flagged(self):
+        broker = LocalBroker()
+
+        async def scenario():
+            subscription = broker.subscribe(['a'])
+            for number in range(events.QUEUE_SIZE + 1):
+                broker.publish('a', number)
+            await asyncio.sleep(0)
+            return subscription.overflowed
+
+        self.assertTrue(asyncio.run(scenario()))
+
+
+class FollowEventsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+            for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def test_polling_fallback_sends_missed_posts(self):
+        url = reverse('posts:follow_events')
+        response = self.client.get(url, {'last_id': self.posts[0].pk})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertIn('retry: 30000', body)
+        self.assertIn(f'id: {self.posts[2].pk}', body)
+        self.assertIn('"new": 2', body)
+        self.assertNotIn(f'id: {self.posts[0].pk}\n', body)
+
+        response = self.client.get(
+            url, {'last_id': self.posts[0].pk},
+            HTTP_LAST_EVENT_ID=str(self.posts[2].pk))
+        self.assertNotIn('event: post', response.content.decode())
+
+    def test_follow_page_connects_to_the_stream(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(
+            response,
+            f'{reverse("posts:follow_events")}?last_id={self.posts[2].pk}')
+
+    def test_later_pages_count_from_the_newest_post(self):
+        with mock.patch('posts.views.page_amount', 1):
+            first = self.client.get(reverse('posts:follow_index'))
+            cursor = first.context['page'].next_cursor
+            response = self.client.get(
+                reverse('posts:follow_index'), {'cursor': cursor})
+        self.assertEqual(response.context['page'][0], self.posts[1])
+        self.assertEqual(response.context['last_id'], self.posts[2].pk)
+
+    def test_stream_pushes_new_posts_until_disconnect(self):
+        session = self.client.cookies['sessionid'].value
+        environ = RequestFactory().get(
+            reverse('posts:follow_events'),
+            {'last_id': self.posts[1].pk},
+            HTTP_COOKIE=f'sessionid={session}').environ
+        post = Post.objects.create(author=self.author, text='Пост 3')
+        fresh = Post(pk=post.pk + 1, author=self.author, text='Свежий пост',
+                     pub_date=timezone.now())
+
+        async def run_sync(function, *args):
+            return function(*args)
+
+        async def scenario():
+            sent = []
+            left = asyncio.Event()
+
+            async def receive():
+                await left.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            stream = asyncio.ensure_future(
+                follow_stream({}, receive, send, environ, run_sync))
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+            publish_post(post)
+            publisher = threading.Thread(target=publish_post, args=(fresh,))
+            publisher.start()
+            while len(sent) < 3:
+                await asyncio.sleep(0.01)
+            publisher.join()
+            left.set()
+            await stream
+            return sent
+
+        sent = asyncio.run(scenario())
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(f'id: {self.posts[2].pk}'.encode(), sent[1]['body'])
+        self.assertIn(f'id: {post.pk}'.encode(), sent[1]['body'])
+        self.assertIn(b'"new": 3', sent[2]['body'])
+        self.assertIn('Свежий пост'.encode(), sent[2]['body'])
+        self.assertFalse(events.broker.channels)
+
+
+class AnnouncementTest(TransactionTestCase):
+    def test_new_posts_and_follows_are_published_on_commit(self):
+        author = User.objects.create_user(username='AnnaY')
+        reader = User.objects.create_user(username='reader')
+        published = []
+        broker = events.broker
+        broker.publish, original = (
+            lambda channel, message: published.append((channel, message)),
+            broker.publish)
+        try:
+            Follow.objects.create(user=reader, author=author)
+            post = Post.objects.create(author=author, text='Пост')
+        finally:
+            broker.publish = original
+        self.assertEqual(published[0][1]['following'], True)
+        self.assertEqual(published[1][0], author_channel(author.pk))
+        self.assertEqual(published[1][1]['post']['id'], post.pk)
@@ -0,0 +1,22 @@
+from io import StringIO
+
+from django.test import TestCase
+
+from posts.benchmark import seed
+from posts.management.commands.explain_views import Command, full_scans
+
+
+class ExplainViewsTest(TestCase):
+    def test_full_scans_are_told_from_index_scans(self):
+        plan = [
+            'SCAN posts_post',
+            'SCAN TABLE posts_group',
+            'SCAN posts_post USING INDEX posts_post_pub_date_131c7f8d',
+            'SEARCH posts_comment USING INDEX comment_post_created_idx',
+        ]
+        self.assertEqual(full_scans(plan), ['posts_post', 'posts_group'])
+
+    def test_views_do_not_scan_whole_tables(self):
+        seed(users=10, groups=2, posts=40, follows=3, comments=30)
+        command = Command(stdout=StringIO())
+        self.assertEqual(command.explain_views(verbose=False), 0)
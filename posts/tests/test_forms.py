@@ -1,14 +1,18 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
-from posts.constants import form_data_for_edit
+from posts.constants import form_data_for_edit, image_max_side
 from posts.forms import CommentForm, PostForm
 from posts.models import Comment, Post
+from posts.uploads import LimitedTemporaryFileUploadHandler
 
 User = get_user_model()
 MEDIA_ROOT = tempfile.mkdtemp()
@@ -62,7 +66,7 @@ class PostCreateEditFormTests(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text='Тестовый текст',
-                image='posts/small.gif',
+                image__regex=r'^posts/[0-9a-f]{64}\.jpg$',
             ).exists()
         )
 
@@ -134,3 +138,83 @@ class CommentCreatedFormTests(TestCase):
                 author=CommentCreatedFormTests.user,
             ).exists()
         )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PostImageNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='AnnaY')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def upload(self, size=(3000, 1000)):
+        content = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        Image.new('RGB', size, 'red').save(content, 'JPEG', exif=exif)
+        return SimpleUploadedFile(
+            name='photo.jpg',
+            content=content.getvalue(),
+            content_type='image/jpeg')
+
+    def test_image_is_resized_and_stripped(self):
+        form = PostForm(data={'text': 'test'}, files={'image': self.upload()})
+        self.assertTrue(form.is_valid())
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (image_max_side, 683))
+            self.assertNotIn('exif', image.info)
+
+    def test_identical_uploads_are_stored_once(self):
+        for _ in range(2):
+            self.authorized_client.post(
+                reverse('posts:new_post'),
+                data={'text': 'test', 'image': self.upload()})
+        images = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+
+    def test_oversized_upload_is_rejected(self):
+        upload = self.upload()
+        upload.too_large = True
+        form = PostForm(data={'text': 'test'}, files={'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['image'], ['Файл слишком большой.'])
+
+    def test_truncated_oversized_upload_is_rejected(self):
+        upload = self.upload()
+        truncated = SimpleUploadedFile(
+            name='photo.jpg',
+            content=upload.read()[:len(upload) // 2],
+            content_type='image/jpeg')
+        truncated.too_large = True
+        form = PostForm(data={'text': 'test'}, files={'image': truncated})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['image'], ['Файл слишком большой.'])
+
+    def test_undecodable_image_is_a_form_error(self):
+        with mock.patch('posts.forms.normalize_image',
+                        side_effect=Image.DecompressionBombError):
+            form = PostForm(
+                data={'text': 'test'}, files={'image': self.upload()})
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_upload_handler_stops_writing_at_limit(self):
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', 30)
+        with mock.patch('posts.uploads.image_max_upload_size', 15):
+            for start in (0, 10, 20):
+                handler.receive_data_chunk(b'x' * 10, start)
+        upload = handler.file_complete(30)
+        self.assertTrue(upload.too_large)
+        self.assertEqual(upload.size, 10)
+        upload.close()
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.instrumentation import (Histogram, Timings, ViewStats,
+                                   profile_templates,
+                                   stop_profiling_templates, template_profile)
+from posts.models import Post
+
+User = get_user_model()
+
+
+class InstrumentationMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='AnnaY')
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        Post.objects.create(author=cls.user, text='Текст поста')
+
+    def test_server_timing_has_every_phase(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for phase in ('db;', 'tpl;', 'cache;', 'total;'):
+            with self.subTest(phase=phase):
+                self.assertIn(phase, timing)
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_slow_queries_are_logged_with_view_name(self):
+        with self.settings(SLOW_QUERY_MS=0):
+            with self.assertLogs('posts.instrumentation', 'WARNING') as logs:
+                self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+
+    def test_stats_are_for_staff_only(self):
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.client.get(reverse('posts:stats')).status_code,
+                         302)
+        self.client.force_login(self.admin)
+        stats = self.client.get(reverse('posts:stats')).json()
+        self.assertGreaterEqual(stats['posts:index']['requests'], 1)
+
+
+class ViewStatsTest(TestCase):
+    def test_old_minutes_leave_the_window(self):
+        stats = ViewStats(window=2)
+        timings = Timings(None)
+        stats.record('posts:index', 3.0, timings, now=0)
+        stats.record('posts:index', 30.0, timings, now=60)
+        self.assertEqual(stats.snapshot(now=60)['posts:index']['requests'], 2)
+        self.assertEqual(stats.snapshot(now=120)['posts:index']['requests'], 1)
+        self.assertEqual(stats.snapshot(now=180), {})
+
+    def test_percentiles_use_bucket_bounds(self):
+        histogram = Histogram()
+        timings = Timings(None)
+        for total in (1.5, 1.5, 1.5, 40.0):
+            histogram.add(total, timings)
+        self.assertEqual(histogram.percentile(0.5), 2)
+        self.assertEqual(histogram.percentile(0.99), 40.0)
+
+
+class TemplateProfileTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        Post.objects.create(author=cls.admin, text='Текст поста')
+
+    def setUp(self):
+        template_profile.reset()
+        profile_templates()
+        self.addCleanup(stop_profiling_templates)
+
+    def test_includes_are_timed_separately(self):
+        self.client.get(reverse('posts:index'))
+        templates = template_profile.snapshot()
+        for name in ('index.html', 'base.html', 'include/post_item.html',
+                     'include/post_card.html'):
+            with self.subTest(name=name):
+                self.assertGreaterEqual(templates[name]['renders'], 1)
+                self.assertLessEqual(templates[name]['own_ms'],
+                                     templates[name]['total_ms'])
+        self.assertLess(templates['include/post_item.html']['own_ms'],
+                        templates['include/post_item.html']['total_ms'])
+
+    def test_profiling_starts_once_and_stops(self):
+        profile_templates()
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            template_profile.snapshot()['index.html']['renders'], 1)
+        stop_profiling_templates()
+        template_profile.reset()
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(template_profile.snapshot(), {})
+
+    def test_template_stats_are_for_staff_only(self):
+        url = reverse('posts:template_stats')
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.admin)
+        self.assertIn('base.html', self.client.get(url).json())
@@ -1,10 +1,13 @@
 import textwrap as tw
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
 from posts.constants import field_help_texts, field_verboses
-from posts.models import Comment, Group, Post
+from posts.models import Comment, Follow, Group, Post
+from users.models import Profile
 
 User = get_user_model()
 
@@ -78,3 +81,43 @@ class CommentModelTest(TestCase):
     def test_comment_str(self):
         comment = CommentModelTest.comment
         self.assertEqual(str(comment), f'{comment.author, comment.text}')
+
+
+class CounterTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='AnnaY')
+        self.reader = User.objects.create_user(username='SashaS')
+        self.post = Post.objects.create(author=self.author, text='test1')
+
+    def test_counters_follow_writes(self):
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.author).posts_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.reader).following_count, 1)
+
+        follow.delete()
+        self.post.delete()
+        author_profile = Profile.objects.get(user=self.author)
+        self.assertEqual(author_profile.posts_count, 0)
+        self.assertEqual(author_profile.followers_count, 0)
+        self.assertEqual(
+            Profile.objects.get(user=self.reader).following_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        Post.objects.update(comment_count=7)
+        Profile.objects.filter(user=self.reader).delete()
+        Profile.objects.filter(user=self.author).update(posts_count=0)
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.author).posts_count, 1)
+        self.assertTrue(Profile.objects.filter(user=self.reader).exists())
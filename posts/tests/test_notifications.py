@@ -0,0 +1,100 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import get_connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Notification, Post
+from posts.notifications import send_digests
+from users.models import Profile
+
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    DIGEST_INTERVAL=3600, DIGEST_MAX_ITEMS=2, DIGEST_BATCH=2,
+    DIGESTS_PER_RUN=None)
+class DigestTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com')
+            for i in range(3)]
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = [
+            Post.objects.create(author=author, text='Пост')
+            for author in cls.authors]
+
+    def setUp(self):
+        for post in self.posts:
+            Comment.objects.create(
+                post=post, author=self.reader, text='Отличный пост')
+            Comment.objects.create(
+                post=post, author=post.author, text='Свой комментарий')
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+
+    def test_comments_and_follows_are_recorded(self):
+        self.assertEqual(Notification.objects.filter(
+            user=self.authors[0]).count(), 2)
+        Follow.objects.filter(author=self.authors[0]).delete()
+        self.assertEqual(Notification.objects.filter(
+            user=self.authors[0]).count(), 1)
+
+    def test_one_digest_per_user_and_connection_per_batch(self):
+        with mock.patch('posts.notifications.get_connection',
+                        wraps=get_connection) as connections:
+            self.assertEqual(send_digests(), 3)
+        self.assertEqual(connections.call_count, 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [author.email for author in self.authors])
+        digest = next(message for message in mail.outbox
+                      if message.to == [self.authors[0].email])
+        self.assertIn('Отличный пост', digest.body)
+        self.assertIn(reverse('posts:profile', args=['reader']), digest.body)
+        self.assertNotIn('Свой комментарий', digest.body)
+        self.assertIn('List-Unsubscribe', digest.extra_headers)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_digests_are_rate_limited(self):
+        send_digests()
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Ещё')
+        self.assertEqual(send_digests(), 0)
+        self.assertEqual(
+            send_digests(now=timezone.now() + timedelta(hours=2)), 1)
+        self.assertIn('Ещё', mail.outbox[-1].body)
+
+    def test_long_digests_are_cut(self):
+        for _ in range(3):
+            Comment.objects.create(
+                post=self.posts[0], author=self.reader, text='Ещё')
+        send_digests(limit=1, now=timezone.now())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('И ещё уведомлений: 3', mail.outbox[0].body)
+
+    def test_unsubscribed_users_get_nothing(self):
+        profile = self.authors[0].profile
+        url = reverse('unsubscribe', args=[profile.unsubscribe_token])
+        response = self.client.get(url)
+        self.assertContains(response, 'Отписаться')
+        self.client.post(url)
+        self.assertEqual(send_digests(), 2)
+        self.assertNotIn(
+            [self.authors[0].email],
+            [message.to for message in mail.outbox])
+        self.assertFalse(Notification.objects.filter(
+            user=self.authors[0]).exists())
+
+        self.client.post(url, {'subscribe': '1'})
+        self.assertTrue(Profile.objects.get(pk=profile.pk).email_digests)
+        self.assertEqual(
+            self.client.get(reverse('unsubscribe', args=['forged']))
+            .status_code, 404)
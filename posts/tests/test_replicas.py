@@ -0,0 +1,87 @@
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve, reverse
+
+from posts.conditional import conditional
+from posts.fragments import invalidate_replica, read_version
+from posts.models import Post
+from posts.replicas import (PIN_COOKIE, ReplicaMiddleware, ReplicaRouter,
+                            current_replica)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    def test_app_reads_follow_the_request_replica(self):
+        router = ReplicaRouter()
+        token = current_replica.set('replica1')
+        try:
+            self.assertEqual(router.db_for_read(Post), 'replica1')
+            self.assertIsNone(router.db_for_read(Session))
+            self.assertEqual(router.db_for_write(Post), 'default')
+        finally:
+            current_replica.reset(token)
+        self.assertIsNone(router.db_for_read(Post))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+
+    def view(self, request):
+        self.seen.append(current_replica.get())
+        return HttpResponse()
+
+    def handle(self, request):
+        request.resolver_match = resolve(request.path)
+        middleware = ReplicaMiddleware(self.view)
+        middleware.process_view(request, self.view, (), {})
+        response = middleware(request)
+        self.assertIsNone(current_replica.get())
+        return response
+
+    def test_feed_reads_go_to_a_replica(self):
+        self.handle(self.factory.get(reverse('posts:index')))
+        self.assertEqual(self.seen, ['replica1'])
+
+    def test_other_views_stay_on_the_primary(self):
+        self.handle(self.factory.get(reverse('posts:new_post')))
+        self.assertEqual(self.seen, [None])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.handle(self.factory.post(reverse('posts:new_post')))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = self.factory.get(reverse('posts:index'))
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.handle(request)
+        self.assertEqual(self.seen, [None, None])
+
+
+class ReplicaPositionTest(SimpleTestCase):
+    def etag(self, replica=None):
+        @conditional(lambda: (('token',), ()))
+        def view(request):
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        token = current_replica.set(replica)
+        try:
+            return view(request)['ETag'], read_version()
+        finally:
+            current_replica.reset(token)
+
+    def test_replica_reads_are_keyed_by_the_replica_position(self):
+        primary = self.etag()
+        lagging = self.etag('replica1')
+        self.assertNotEqual(primary, lagging)
+        self.assertEqual(self.etag('replica1'), lagging)
+
+        invalidate_replica('replica1')
+        synced = self.etag('replica1')
+        self.assertNotEqual(synced[0], lagging[0])
+        self.assertNotEqual(synced[1], lagging[1])
+        self.assertEqual(self.etag(), primary)
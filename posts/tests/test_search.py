@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post, SearchToken
+from posts.search import stem, tokenize
+
+User = get_user_model()
+
+
+class TokenizeTest(TestCase):
+    def test_russian_word_forms_share_a_stem(self):
+        for word in ('вагон', 'вагона', 'вагонов', 'вагоном'):
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), 'вагон')
+
+    def test_tokenize_folds_case_and_drops_stop_words(self):
+        self.assertEqual(
+            tokenize('Ёлки и ПАЛКИ, hello'), ['елк', 'палк', 'hello'])
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='AnnaY')
+        cls.in_text = Post.objects.create(
+            author=cls.user, text='Поезд из пяти вагонов')
+        cls.in_comment = Post.objects.create(
+            author=cls.user, text='Фото с вокзала')
+        cls.comment = Comment.objects.create(
+            post=cls.in_comment, author=cls.user, text='Какой вагон!')
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page'].object_list)
+
+    def test_text_hits_rank_above_comment_hits(self):
+        self.assertEqual(
+            self.search('вагоны'), [self.in_text, self.in_comment])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('вагон вокзал'), [self.in_comment])
+        self.assertEqual(self.search('пустота'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.in_text.text = 'Пустая платформа'
+        self.in_text.save()
+        self.comment.delete()
+        self.assertEqual(self.search('вагон'), [])
+        self.assertFalse(
+            SearchToken.objects.filter(post=self.in_text, token='поезд')
+            .exists())
@@ -0,0 +1,157 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import FeedEntry, Follow, Post, SearchToken, Task
+from posts.tasks import (BackgroundTasksMiddleware, run_after_response,
+                         run_pending, task, task_transaction)
+
+User = get_user_model()
+
+calls = []
+
+
+@task(retries=1)
+def record(*args):
+    calls.append(args)
+
+
+@task(batch=True)
+def record_batch(batched):
+    calls.append(batched)
+
+
+@task()
+def record_transaction():
+    calls.append(len(connection.savepoint_ids))
+    with task_transaction():
+        calls.append(Task.objects.count())
+    calls.append(Task.objects.count())
+
+
+@task(background=True)
+def record_later(*args):
+    calls.append(args)
+
+
+@task(retries=1)
+def explode():
+    raise ValueError('boom')
+
+
+@override_settings(TASKS_EAGER=False, TASKS_RETRY_DELAY=0)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_queued_calls_run_in_the_worker(self):
+        record.delay(1, 'a')
+        self.assertEqual(calls, [])
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(calls, [(1, 'a')])
+        self.assertFalse(Task.objects.exists())
+
+    def test_pending_calls_with_the_same_key_run_once(self):
+        record.delay(1, key='one')
+        record.delay(2, key='one')
+        run_pending()
+        record.delay(3, key='one')
+        run_pending()
+        self.assertEqual(calls, [(1,), (3,)])
+
+    def test_batch_functions_get_every_call_at_once(self):
+        for number in range(3):
+            record_batch.delay(number, 'x')
+        self.assertEqual(run_pending(), (3, 0))
+        self.assertEqual(calls, [[[0, 'x'], [1, 'x'], [2, 'x']]])
+
+    def test_failing_tasks_are_retried_then_kept(self):
+        explode.delay()
+        with self.assertLogs('posts.tasks'):
+            self.assertEqual(run_pending(), (0, 1))
+        self.assertEqual(Task.objects.get().attempts, 1)
+        with self.assertLogs('posts.tasks'):
+            self.assertEqual(run_pending(), (0, 1))
+        failed = Task.objects.get()
+        self.assertTrue(failed.failed)
+        self.assertIn('boom', failed.error)
+        self.assertEqual(run_pending(), (0, 0))
+
+    def test_claimed_tasks_are_not_taken_until_the_lease_ends(self):
+        record.delay(1)
+        Task.objects.update(locked_until=timezone.now()
+                            + timezone.timedelta(minutes=1))
+        self.assertEqual(run_pending(), (0, 0))
+        Task.objects.update(locked_until=timezone.now()
+                            - timezone.timedelta(minutes=1))
+        self.assertEqual(run_pending(), (1, 0))
+
+    def test_tasks_run_outside_of_a_transaction(self):
+        record_transaction.delay()
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(calls, [len(connection.savepoint_ids), 1, 0])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_calls_run_right_away(self):
+        record_batch.delay(1)
+        self.assertEqual(calls, [[[1]]])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_background_calls_wait_for_the_commit(self):
+        with mock.patch('posts.tasks.run_after_response') as background:
+            record_later.delay(1)
+            self.assertEqual(calls, [])
+            self.assertFalse(background.called)
+
+    def test_background_calls_wait_for_the_response(self):
+        def view(request):
+            run_after_response(record_later, [[1]])
+            return HttpResponse()
+
+        middleware = BackgroundTasksMiddleware(view)
+        response = middleware(RequestFactory().get('/'))
+        self.assertEqual(calls, [])
+        response.close()
+        self.assertEqual(calls, [(1,)])
+        run_after_response(record_later, [[2]])
+        self.assertEqual(calls, [(1,), (2,)])
+
+
+@override_settings(TASKS_EAGER=False)
+class QueuedSideEffectsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        run_pending()
+
+    def test_new_posts_are_delivered_by_the_worker(self):
+        self.client.force_login(self.author)
+        self.client.post(reverse('posts:new_post'), {'text': 'Новый пост'})
+        post = Post.objects.get()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertFalse(SearchToken.objects.exists())
+        self.assertEqual(Task.objects.count(), 2)
+
+        call_command('run_tasks', once=True, stdout=mock.Mock())
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertTrue(SearchToken.objects.filter(post=post).exists())
+        self.assertFalse(Task.objects.exists())
+
+    def test_undone_follows_are_skipped(self):
+        Post.objects.create(author=self.reader, text='Пост')
+        run_pending()
+        follow = Follow.objects.create(user=self.author, author=self.reader)
+        follow.delete()
+        run_pending()
+        self.assertFalse(FeedEntry.objects.filter(user=self.author).exists())
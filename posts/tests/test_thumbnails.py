@@ -0,0 +1,90 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.constants import thumbnail_formats, thumbnail_sizes
+from posts.models import Post, Thumbnail
+from posts.thumbnails import generate_thumbnails
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name='photo.png'):
+    content = BytesIO()
+    Image.new('RGB', (100, 60), 'red').save(content, 'PNG')
+    return SimpleUploadedFile(
+        name=name,
+        content=content.getvalue(),
+        content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='AnnaY')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_every_size_and_format_is_generated(self):
+        post = Post.objects.create(
+            author=self.user, text='test1', image=make_image())
+        self.assertEqual(post.thumbnail_srcsets, {})
+
+        generate_thumbnails(post.pk, post.image.name)
+
+        thumbnails = Thumbnail.objects.filter(post=post)
+        self.assertEqual(
+            thumbnails.count(), len(thumbnail_sizes) * len(thumbnail_formats))
+        for thumbnail in thumbnails:
+            with self.subTest(size=thumbnail.size, format=thumbnail.format):
+                with Image.open(thumbnail.image.path) as image:
+                    self.assertEqual(
+                        image.size, thumbnail_sizes[thumbnail.size])
+        srcsets = Post.objects.get(pk=post.pk).thumbnail_srcsets
+        self.assertIn('webp', srcsets)
+        self.assertTrue(srcsets['src'].endswith('.jpeg'))
+
+    def test_outdated_job_is_skipped(self):
+        post = Post.objects.create(
+            author=self.user, text='test1', image=make_image())
+        generate_thumbnails(post.pk, 'posts/replaced.png')
+        self.assertFalse(Thumbnail.objects.filter(post=post).exists())
+
+    def test_new_post_schedules_thumbnails(self):
+        with mock.patch('posts.views.schedule_thumbnails') as schedule:
+            self.authorized_client.post(
+                reverse('posts:new_post'),
+                data={'text': 'test1', 'image': make_image()})
+        schedule.assert_called_once()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, Post.objects.get().image.url)
+
+    def test_backfill_queues_posts_without_thumbnails(self):
+        done = Post.objects.create(
+            author=self.user, text='test1', image=make_image())
+        generate_thumbnails(done.pk, done.image.name)
+        missing = Post.objects.create(
+            author=self.user, text='test2', image=make_image('other.png'))
+        Post.objects.create(author=self.user, text='test3')
+        with mock.patch('posts.management.commands.backfill_thumbnails.'
+                        'schedule_thumbnails') as schedule:
+            call_command('backfill_thumbnails', stdout=StringIO())
+        self.assertEqual(
+            [call.args[0].pk for call in schedule.call_args_list],
+            [missing.pk])
@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+from posts.search import find_posts
+from posts.transfer import (ImportConflict, Importer, export_rows,
+                            read_rows, write_rows)
+
+User = get_user_model()
+
+
+def dump(kind, data_format):
+    file = StringIO()
+    write_rows(export_rows(kind), file, kind, data_format)
+    file.seek(0)
+    return file
+
+
+def load(kind, file, data_format, **kwargs):
+    importer = Importer(kind, batch_size=2, **kwargs)
+    return importer.run(read_rows(file, data_format))
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост про вагоны {i}',
+                group=cls.group if i % 2 else None)
+            for i in range(3)]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Отличный поезд')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def round_trip(self, data_format):
+        files = {kind: dump(kind, data_format)
+                 for kind in ('posts', 'comments', 'follows')}
+        expected = list(Post.objects.values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date'))
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        results = {kind: load(kind, files[kind], data_format)
+                   for kind in ('posts', 'comments', 'follows')}
+        self.assertEqual(results, {
+            'posts': (3, 0), 'comments': (1, 0), 'follows': (1, 0)})
+        self.assertEqual(list(Post.objects.values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date')),
+            expected)
+
+    def test_ndjson_round_trip(self):
+        self.round_trip('ndjson')
+
+    def test_csv_round_trip(self):
+        self.round_trip('csv')
+
+    def test_import_builds_feeds_counters_and_search(self):
+        self.round_trip('ndjson')
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(
+            Post.objects.get(pk=self.posts[0].pk).comment_count, 1)
+        self.assertEqual(find_posts('поезд').get(), self.posts[0])
+
+    def test_existing_rows_and_follows_are_skipped(self):
+        files = {kind: dump(kind, 'ndjson') for kind in ('posts', 'follows')}
+        self.assertEqual(load('posts', files['posts'], 'ndjson'), (0, 3))
+        self.assertEqual(load('follows', files['follows'], 'ndjson'), (0, 1))
+
+    def test_unknown_users_are_skipped_or_created(self):
+        rows = '{"author": "newbie", "text": "Привет", "group": "new"}\n'
+        self.assertEqual(load('posts', StringIO(rows), 'ndjson'), (0, 1))
+        self.assertEqual(
+            load('posts', StringIO(rows), 'ndjson', create_missing=True),
+            (1, 0))
+        post = Post.objects.get(author__username='newbie')
+        self.assertEqual(post.group.slug, 'new')
+        self.assertGreater(post.pk, self.posts[-1].pk)
+        self.assertEqual(post.author.profile.posts_count, 1)
+
+    def test_taken_ids_are_refused_or_renumbered(self):
+        files = {kind: dump(kind, 'ndjson') for kind in ('posts', 'comments')}
+        exported = self.posts[0].pk
+        Post.objects.all().delete()
+        Post.objects.create(pk=exported, author=self.reader, text='Чужой')
+        with self.assertRaises(ImportConflict):
+            load('posts', files['posts'], 'ndjson')
+
+        files['posts'].seek(0)
+        id_map = {}
+        self.assertEqual(
+            load('posts', files['posts'], 'ndjson', id_map=id_map), (3, 0))
+        self.assertEqual(
+            load('comments', files['comments'], 'ndjson', id_map=id_map),
+            (1, 0))
+        renumbered = Post.objects.get(pk=id_map['posts'][exported])
+        self.assertEqual(renumbered.text, self.posts[0].text)
+        self.assertEqual(renumbered.comments.get().text, 'Отличный поезд')
+        self.assertFalse(Comment.objects.filter(post_id=exported).exists())
+
+    def test_new_ids_skip_the_ids_of_the_batch(self):
+        taken = self.posts[-1].pk + 1
+        rows = (
+            '{"author": "AnnaY", "text": "Без номера"}\n'
+            f'{{"id": {taken}, "author": "AnnaY", "text": "С номером"}}\n')
+        self.assertEqual(load('posts', StringIO(rows), 'ndjson'), (2, 0))
+        self.assertEqual(Post.objects.get(pk=taken).text, 'С номером')
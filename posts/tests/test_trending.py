@@ -0,0 +1,109 @@
+import math
+from datetime import timedelta
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.constants import trending_half_life
+from posts.models import Comment, Group, Post
+from posts.trending import event_score, log_add, log_sub, trending_posts
+from posts.viewcounts import view_counter
+
+User = get_user_model()
+
+
+class ScoreTest(TestCase):
+    def test_log_space_arithmetic(self):
+        self.assertAlmostEqual(log_add(3, 3), 4)
+        self.assertAlmostEqual(log_add(10, 1), math.log2(2 ** 10 + 2))
+        self.assertAlmostEqual(log_sub(4, 3), 3)
+        self.assertIsNone(log_sub(3, 3))
+
+    def test_events_halve_every_half_life(self):
+        now = timezone.now()
+        earlier = now - timedelta(hours=trending_half_life)
+        self.assertAlmostEqual(
+            event_score('view', now) - event_score('view', earlier), 1)
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.old = Post.objects.create(author=cls.author, text='Старый')
+        published = timezone.now() - timedelta(days=3)
+        Post.objects.filter(pk=cls.old.pk).update(
+            pub_date=published, trend_score=event_score('post', published))
+        cls.new = Post.objects.create(
+            author=cls.author, text='Новый', group=cls.group)
+
+    def score(self, post):
+        return Post.objects.values_list('trend_score', flat=True).get(
+            pk=post.pk)
+
+    def comment(self, post):
+        return Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+
+    def test_new_posts_are_scored_on_creation(self):
+        self.assertAlmostEqual(
+            self.score(self.new),
+            event_score('post', self.new.pub_date), places=6)
+        self.assertEqual(list(trending_posts()), [self.new, self.old])
+
+    def test_comments_add_and_remove_engagement(self):
+        before = self.score(self.new)
+        comment = self.comment(self.new)
+        self.assertGreater(self.score(self.new), before)
+        comment.delete()
+        self.assertAlmostEqual(self.score(self.new), before, places=6)
+
+    def test_fresh_engagement_lifts_older_posts(self):
+        self.comment(self.old)
+        self.assertEqual(list(trending_posts()), [self.old, self.new])
+
+    def test_views_are_counted(self):
+        before = self.score(self.old)
+        self.client.get(
+            reverse('posts:post', args=[self.author.username, self.old.pk]))
+        view_counter.flush()
+        self.assertGreater(self.score(self.old), before)
+
+    def test_trending_pages(self):
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            list(response.context['posts']), [self.new, self.old])
+        response = self.client.get(
+            reverse('posts:group_trending', args=[self.group.slug]))
+        self.assertEqual(list(response.context['posts']), [self.new])
+        self.assertEqual(response.context['group'], self.group)
+
+    def test_top_posts_are_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            list(trending_posts(amount=10))
+
+
+class ScoreMigrationTest(TestCase):
+    def test_migration_matches_the_live_scores(self):
+        migration = import_module('posts.migrations.0018_trend_score')
+        author = User.objects.create_user(username='AnnaY')
+        posts = [Post.objects.create(author=author, text=f'Пост {i}')
+                 for i in range(3)]
+        for post in posts[1:]:
+            for _ in range(2):
+                Comment.objects.create(post=post, author=author, text='К')
+        Comment.objects.bulk_create(
+            [Comment(post=None, author=author, text='Без поста')])
+        live = dict(Post.objects.values_list('pk', 'trend_score'))
+        Post.objects.update(trend_score=0)
+        with self.assertNumQueries(3):
+            migration.score_posts(apps, None)
+        for pk, score in Post.objects.values_list('pk', 'trend_score'):
+            self.assertAlmostEqual(score, live[pk])
@@ -4,7 +4,7 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.test import Client, TestCase
 
-from posts.models import Group, Post
+from posts.models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -24,6 +24,7 @@ class PostURLTests(TestCase):
         cls.authorized_client_edit.force_login(cls.user_edit)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user_no_edit = User.objects.create_user(username='SashaS')
         self.authorized_client_no_edit = Client()
@@ -100,7 +101,8 @@ class PostURLTests(TestCase):
         response = self.authorized_client_no_edit.get('/')
         last_cache_post = response.content
 
-        self.post = Post.objects.create(text='new', author=self.user_no_edit)
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Some love is just a lie of the heart')
 
         response = self.authorized_client_no_edit.get('/')
         current_cache_post = response.content
@@ -117,3 +119,21 @@ class PostURLTests(TestCase):
             current_cache_post,
             new_cache_post,
             'Caching is not working.')
+
+    def test_cache_index_page_invalidated_on_post_and_comment(self):
+        response = self.authorized_client_no_edit.get('/')
+        before_post = response.content
+
+        post = Post.objects.create(text='new', author=self.user_no_edit)
+        response = self.authorized_client_no_edit.get('/')
+        self.assertNotEqual(before_post, response.content)
+        before_comment = response.content
+
+        Comment.objects.create(post=post, author=self.user_edit, text='hi')
+        response = self.authorized_client_no_edit.get('/')
+        self.assertNotEqual(before_comment, response.content)
+
+    def test_cache_index_page_varies_on_user(self):
+        self.authorized_client_edit.get('/')
+        response = self.authorized_client_no_edit.get('/')
+        self.assertNotContains(response, 'Редактировать')
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.viewcounts import ViewCounter, view_counter
+
+User = get_user_model()
+
+
+@override_settings(VIEW_COUNTS_BATCH=3, VIEW_COUNTS_INTERVAL=60)
+class ViewCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+            for i in range(2)]
+
+    def setUp(self):
+        self.counter = ViewCounter()
+
+    def stored(self):
+        return list(Post.objects.order_by('pk').values_list(
+            'view_count', flat=True))
+
+    def test_views_are_written_in_one_batch(self):
+        scores = [post.trend_score for post in self.posts]
+        self.counter.add(self.posts[0].pk)
+        self.counter.add(self.posts[1].pk)
+        self.assertEqual(self.stored(), [0, 0])
+        self.assertEqual(self.counter.pending(self.posts[0].pk), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.counter.add(self.posts[0].pk)
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries
+             if 'posts_post' in query['sql']], ['SELECT', 'UPDATE'])
+        self.assertEqual(self.stored(), [2, 1])
+        self.assertEqual(self.counter.pending(self.posts[0].pk), 0)
+        self.assertEqual(self.counter.flush(), 0)
+        self.assertTrue(all(
+            post.trend_score > score for post, score in zip(
+                Post.objects.order_by('pk'), scores)))
+
+    def test_failed_flush_keeps_the_views(self):
+        self.counter.add(self.posts[0].pk)
+        with mock.patch('posts.viewcounts.write_views',
+                        side_effect=DatabaseError), \
+                self.assertLogs('posts.viewcounts'):
+            self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(self.counter.pending(self.posts[0].pk), 1)
+        self.assertEqual(self.counter.flush(), 1)
+        self.assertEqual(self.stored(), [1, 0])
+
+    def test_views_stay_buffered_until_written(self):
+        self.counter.add(self.posts[0].pk)
+        with mock.patch('posts.viewcounts.write_views',
+                        side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.counter.flush()
+        self.assertEqual(self.counter.pending(self.posts[0].pk), 1)
+
+    @mock.patch('posts.viewcounts.threading.Thread')
+    def test_the_flusher_thread_writes_instead_of_requests(self, thread):
+        self.counter.start()
+        self.assertFalse(thread.called)
+        for _ in range(3):
+            self.counter.add(self.posts[0].pk)
+        self.assertEqual(self.stored(), [0, 0])
+        self.assertTrue(self.counter.wake.is_set())
+        thread.return_value.start.assert_called_once_with()
+        self.counter.flush()
+        self.assertEqual(self.stored(), [3, 0])
+
+    @mock.patch('posts.viewcounts.threading.Thread')
+    def test_forked_processes_start_their_own_flusher(self, thread):
+        self.counter.start()
+        self.counter.add(self.posts[0].pk)
+        with mock.patch('posts.viewcounts.os.getpid', return_value=-1):
+            self.counter.add(self.posts[0].pk)
+        self.assertEqual(thread.return_value.start.call_count, 2)
+        thread.return_value.is_alive.return_value = False
+        self.counter.add(self.posts[0].pk)
+        self.assertEqual(thread.return_value.start.call_count, 3)
+
+    def test_revalidated_post_pages_are_counted(self):
+        view_counter.flush()
+        url = reverse('posts:post', args=[self.author.username,
+                                          self.posts[1].pk])
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(view_counter.pending(self.posts[1].pk), 2)
+
+        view_counter.flush()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Просмотров: 2')
+        view_counter.flush()
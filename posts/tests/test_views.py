@@ -1,16 +1,20 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.constants import form_data_for_edit
-from posts.models import Comment, Follow, Group, Post
+from posts.constants import comments_page_amount, form_data_for_edit
+from posts.models import Comment, FeedEntry, Follow, Group, Post
 
 User = get_user_model()
 MEDIA_ROOT = tempfile.mkdtemp()
@@ -254,8 +258,28 @@ class PaginatorTest(TestCase):
         self.assertEqual(len(response.context.get('page').object_list), 10)
 
     def test_index_second_page_containse_three_records(self):
-        response = self.client.get(reverse('posts:index'), {'page': 2},)
+        first_page = self.client.get(reverse('posts:index')).context['page']
+        response = self.client.get(
+            reverse('posts:index'),
+            {'cursor': first_page.next_cursor},)
         self.assertEqual(len(response.context.get('page').object_list), 3)
+        self.assertFalse(response.context.get('page').has_next())
+
+    def test_index_previous_cursor_returns_first_page(self):
+        first_page = self.client.get(reverse('posts:index')).context['page']
+        second_page = self.client.get(
+            reverse('posts:index'),
+            {'cursor': first_page.next_cursor},).context['page']
+        response = self.client.get(
+            reverse('posts:index'),
+            {'cursor': second_page.previous_cursor},)
+        page = response.context.get('page')
+        self.assertEqual(list(page.object_list), list(first_page.object_list))
+        self.assertFalse(page.has_previous())
+
+    def test_index_invalid_cursor_returns_first_page(self):
+        response = self.client.get(reverse('posts:index'), {'cursor': '!'},)
+        self.assertEqual(len(response.context.get('page').object_list), 10)
 
     def test_group_first_page_containse_ten_records(self):
         response = self.client.get(
@@ -266,9 +290,254 @@ class PaginatorTest(TestCase):
         self.assertEqual(len(response.context.get('page').object_list), 10)
 
     def test_group_second_page_containse_three_records(self):
+        first_page = self.client.get(
+            reverse(
+                'posts:group',
+                args=[PaginatorTest.group.slug])
+        ).context['page']
         response = self.client.get(
             reverse(
                 ('posts:group'),
                 args=[PaginatorTest.group.slug]),
-            {'page': 2},)
+            {'cursor': first_page.next_cursor},)
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='SashaS')
+        cls.reader = User.objects.create_user(username='TashaS')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page'].object_list)
+
+    def test_new_post_is_delivered_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='test1')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        post = Post.objects.create(author=self.author, text='test1')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.get_feed(), [post])
+
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.get_feed(), [])
+
+    def test_popular_author_posts_are_pulled(self):
+        other = User.objects.create_user(username='Kirill')
+        Follow.objects.create(user=self.reader, author=other)
+        pushed = Post.objects.create(author=other, text='test1')
+        with mock.patch('posts.feed.popular_author_followers', 1):
+            Follow.objects.create(user=self.reader, author=self.author)
+            pulled = Post.objects.create(author=self.author, text='test2')
+            self.assertFalse(FeedEntry.objects.filter(post=pulled).exists())
+            self.assertEqual(self.get_feed(), [pulled, pushed])
+
+
+class FeedQueryCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='TashaS')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+        cls.group = Group.objects.create(
+            title='Test',
+            slug='test-group',
+            description='test1')
+        cls.author = User.objects.create_user(username='SashaS')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def add_posts(self, amount):
+        for i in range(amount):
+            author = User.objects.create_user(
+                username=f'author{User.objects.count()}')
+            Follow.objects.create(user=self.reader, author=author)
+            Post.objects.create(author=author, text=f'test{i}',
+                                group=self.group)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_feed_query_count_does_not_grow_with_page_size(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group', args=[self.group.slug]),
+            reverse('posts:follow_index'),
+        )
+        self.add_posts(1)
+        expected = {url: self.count_queries(url) for url in urls}
+        self.add_posts(9)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected[url])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Текст поста', group=cls.group)
+        cls.urls = (
+            reverse('posts:post', args=[cls.author.username, cls.post.pk]),
+            reverse('posts:profile', args=[cls.author.username]),
+            reverse('posts:group', args=[cls.group.slug]),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, client=None):
+        client = client or self.client
+        etag = client.get(url)['ETag']
+        return lambda: client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertEqual(
+                    self.revalidate(url)(), HTTPStatus.NOT_MODIFIED)
+
+    def test_edits_and_comments_change_the_etag(self):
+        changes = (
+            (lambda: Post.objects.get(pk=self.post.pk).save(), self.urls),
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+             self.urls),
+            (lambda: Follow.objects.create(
+                user=self.reader, author=self.author), self.urls[:2]),
+        )
+        for change, urls in changes:
+            statuses = [self.revalidate(url) for url in urls]
+            change()
+            for url, status in zip(urls, statuses):
+                with self.subTest(url=url):
+                    self.assertEqual(status(), HTTPStatus.OK)
+
+    def test_activity_elsewhere_keeps_profile_and_group_etags(self):
+        statuses = [self.revalidate(url) for url in self.urls[1:]]
+        other = User.objects.create_user(username='other')
+        post = Post.objects.create(author=other, text='Другой пост')
+        Comment.objects.create(post=post, author=other, text='Комментарий')
+        for url, status in zip(self.urls[1:], statuses):
+            with self.subTest(url=url):
+                self.assertEqual(status(), HTTPStatus.NOT_MODIFIED)
+
+    def test_moving_a_post_changes_the_old_group_etag(self):
+        status = self.revalidate(self.urls[2])
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:post_edit', args=[
+                self.author.username, self.post.pk]),
+            {'text': 'Текст поста'})
+        self.assertEqual(status(), HTTPStatus.OK)
+
+    def test_moving_a_post_anywhere_changes_the_old_group_etag(self):
+        status = self.revalidate(self.urls[2])
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = None
+        post.save()
+        self.assertEqual(status(), HTTPStatus.OK)
+
+    def test_group_edit_changes_the_group_etag(self):
+        status = self.revalidate(self.urls[2])
+        self.group.description = 'Новое описание'
+        self.group.save()
+        self.assertEqual(status(), HTTPStatus.OK)
+
+    def test_etag_depends_on_the_viewer(self):
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_missing_pages_are_still_not_found(self):
+        response = self.client.get(
+            reverse('posts:post', args=[self.author.username, 0]),
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='AnnaY')
+        cls.post = Post.objects.create(author=cls.author, text='Текст поста')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'comment{i}')
+            for i in range(comments_page_amount + 5))
+        cls.comments = list(Comment.objects.order_by('created', 'pk'))
+        cls.post_url = reverse(
+            'posts:post', args=[cls.author.username, cls.post.pk])
+        cls.comments_url = reverse(
+            'posts:comments', args=[cls.author.username, cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_is_rendered_with_the_post(self):
+        context = self.client.get(self.post_url).context
+        page = context['comment_page']
+        self.assertEqual(
+            list(page), self.comments[:comments_page_amount])
+        self.assertTrue(page.has_next())
+        self.assertEqual(
+            list(context['comments']), self.comments[:comments_page_amount])
+
+    def test_fragment_continues_from_the_cursor(self):
+        cursor = self.client.get(
+            self.post_url).context['comment_page'].next_cursor
+        response = self.client.get(self.comments_url, {'cursor': cursor})
+        self.assertEqual(
+            list(response.context['comment_page']),
+            self.comments[comments_page_amount:])
+        self.assertContains(response, 'comment24')
+        self.assertNotContains(response, 'Ещё комментарии')
+
+    def test_json_lists_comments_with_authors(self):
+        data = self.client.get(
+            self.comments_url, {'format': 'json'}).json()
+        self.assertEqual(len(data['comments']), comments_page_amount)
+        self.assertEqual(data['comments'][0]['author'], 'AnnaY')
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_query_count_does_not_grow_with_comments(self):
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(self.comments_url)
+        Comment.objects.create(
+            post=self.post,
+            author=User.objects.create_user(username='other'),
+            text='ещё один')
+        cache.clear()
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(self.comments_url)
+        self.assertEqual(len(after), len(before))
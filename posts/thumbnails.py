@@ -0,0 +1,75 @@
+"""Background generation of post image thumbnails.
+
+Thumbnails of every size in ``thumbnail_sizes`` are made in each of
+``thumbnail_formats`` by a ``posts.tasks`` worker once the post is
+committed, so neither the upload request nor feed rendering waits for
+Pillow. Cards show the stored image until ``Thumbnail`` rows exist, and
+the post's cached card is invalidated when they appear. Images saved by
+other means, e.g. the ORM, get theirs from ``manage.py
+backfill_thumbnails``.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from .constants import thumbnail_formats, thumbnail_sizes
+from .fragments import invalidate_post
+from .models import Post, Thumbnail
+from .tasks import task, task_transaction
+
+
+def schedule_thumbnails(post):
+    """Queue thumbnails of ``post.image``, once per uploaded image."""
+    generate_thumbnails.delay(
+        post.pk, post.image.name,
+        key=f'thumbnails:{post.pk}:{post.image.name}'[:255])
+
+
+@task(retries=2, background=True)
+def generate_thumbnails(post_id, image_name=None):
+    """Make every thumbnail of a post and replace the previous ones.
+
+    A post without an image just loses its old thumbnails. Nothing is done
+    when the post is gone or its image is no longer ``image_name``: a later
+    upload has its own job queued.
+    """
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None:
+        return
+    if image_name is not None and post.image.name != image_name:
+        return
+    thumbnails = _resize(post) if post.image else []
+    with task_transaction():
+        old = list(Thumbnail.objects.filter(post_id=post_id))
+        Thumbnail.objects.filter(post_id=post_id).delete()
+        Thumbnail.objects.bulk_create(thumbnails)
+    for thumbnail in old:
+        thumbnail.image.delete(save=False)
+    invalidate_post(post_id)
+
+
+def _resize(post):
+    with post.image.open('rb') as source_file:
+        source = Image.open(source_file)
+        source = ImageOps.exif_transpose(source).convert('RGB')
+
+    thumbnails = []
+    for size, dimensions in thumbnail_sizes.items():
+        resized = ImageOps.fit(source, dimensions, Image.LANCZOS)
+        for image_format in thumbnail_formats:
+            if image_format == 'webp' and not features.check('webp'):
+                continue
+            content = BytesIO()
+            resized.save(content, image_format.upper(), quality=85)
+            thumbnail = Thumbnail(
+                post_id=post.pk,
+                size=size,
+                format=image_format,
+                width=dimensions[0])
+            thumbnail.image.save(
+                f'{post.pk}_{size}.{image_format}',
+                ContentFile(content.getvalue()),
+                save=False)
+            thumbnails.append(thumbnail)
+    return thumbnails
@@ -0,0 +1,338 @@
+"""Streaming export and import of posts, comments and follows.
+
+Rows are newline-delimited JSON objects or CSV lines with the fields in
+``FIELDS``. Users are referenced by username and groups by slug, so a
+dump can be loaded into another database. Both directions stream: the
+export iterates the table in chunks and the import reads, resolves and
+inserts ``batch_size`` rows at a time with ``bulk_create``. Post and
+comment ids are kept, so an ``id_map`` is only needed when they clash
+with other rows of the target database (see ``Importer``).
+
+``bulk_create`` skips model signals, so every imported batch also gets
+the feed entries, search tokens, trending scores, thumbnails and cache
+invalidation the signals would have made, and the counters are reconciled
+at the end.
+"""
+import csv
+import json
+import time
+from collections import defaultdict
+from io import StringIO
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Max, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .feed import backfill_feeds, fan_out_posts
+from .fragments import invalidate_feed, invalidate_many
+from .models import Comment, Follow, Group, Post
+from .search import index_new_posts, reindex_comments
+from .thumbnails import schedule_thumbnails
+from .trending import event_score, record
+
+User = get_user_model()
+
+FIELDS = {
+    'posts': ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+FORMATS = ('ndjson', 'csv')
+date_chunk = 100
+
+
+def export_rows(kind, chunk_size=2000):
+    """Yield the rows of ``kind`` as dicts of ``FIELDS[kind]``."""
+    if kind == 'posts':
+        rows = Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+            'image')
+    elif kind == 'comments':
+        rows = Comment.objects.order_by('pk').values_list(
+            'pk', 'post_id', 'author__username', 'text', 'created')
+    else:
+        rows = Follow.objects.order_by('pk').values_list(
+            'user__username', 'author__username')
+    for values in rows.iterator(chunk_size=chunk_size):
+        yield {
+            field: value.isoformat() if hasattr(value, 'isoformat') else value
+            for field, value in zip(FIELDS[kind], values)}
+
+
+def write_rows(rows, file, kind, data_format):
+    if data_format == 'csv':
+        writer = csv.DictWriter(file, FIELDS[kind])
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def read_rows(file, data_format):
+    if data_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _int(value):
+    return int(value) if value not in (None, '') else None
+
+
+def _date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+def bulk_create_dated(model, objs, field):
+    """``bulk_create`` that keeps given values of ``auto_now_add`` ``field``.
+
+    The insert sets the field to now, so the given dates are written back
+    with an ``UPDATE`` per ``date_chunk`` rows. The field itself is left
+    alone: it is shared with every other thread using the model.
+    """
+    dates = [getattr(obj, field) for obj in objs]
+    model.objects.bulk_create(objs)
+    for obj, date in zip(objs, dates):
+        setattr(obj, field, date)
+    for chunk in chunked(objs, date_chunk):
+        model.objects.filter(pk__in=[obj.pk for obj in chunk]).update(**{
+            field: Case(
+                *(When(pk=obj.pk, then=Value(getattr(obj, field)))
+                  for obj in chunk),
+                output_field=DateTimeField())})
+
+
+class ImportConflict(Exception):
+    pass
+
+
+class Importer:
+    """Loads rows of one kind in batches and reports the outcome.
+
+    Rows keep their ``id``; rows without one get ids above those in use
+    and in their batch, so that the derived rows of a batch can refer to
+    them, and sequences are reset at the end. A row whose id is taken by
+    the same row (same author and date, and post for comments) was
+    imported before and is skipped. One whose id is taken by another row
+    raises ``ImportConflict``, unless an ``id_map`` is given: the row then
+    gets a new id, recorded in ``id_map[kind]`` as exported id -> new id,
+    and comments are attached through ``id_map['posts']``. Pass the same
+    map to the posts and comments imports. Follows that already exist and
+    rows referring to unknown users, groups or posts are skipped unless
+    ``create_missing`` lets users and groups be created.
+    """
+
+    def __init__(self, kind, batch_size=500, create_missing=False,
+                 progress=None, id_map=None):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.progress = progress
+        self.id_map = id_map
+        self.imported = self.skipped = 0
+
+    def run(self, rows):
+        self.next_id = None
+        started = time.monotonic()
+        try:
+            for batch in chunked(rows, self.batch_size):
+                with transaction.atomic():
+                    getattr(self, f'import_{self.kind}')(batch)
+                if self.progress is not None:
+                    rate = (self.imported + self.skipped) / max(
+                        time.monotonic() - started, 1e-6)
+                    self.progress(
+                        f'{self.kind}: {self.imported} imported, '
+                        f'{self.skipped} skipped ({rate:.0f} rows/s)')
+        finally:
+            self.finish()
+        return self.imported, self.skipped
+
+    def finish(self):
+        sequences = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment])
+        if sequences:
+            with connection.cursor() as cursor:
+                for sql in sequences:
+                    cursor.execute(sql)
+        call_command('reconcile_counters', stdout=StringIO())
+        invalidate_feed()
+
+    def mapped(self, kind):
+        return {} if self.id_map is None else self.id_map.setdefault(
+            kind, {})
+
+    def users(self, names):
+        names = set(names)
+        found = dict(User.objects.filter(
+            username__in=names).values_list('username', 'pk'))
+        missing = names - set(found)
+        if missing and self.create_missing:
+            User.objects.bulk_create(
+                User(username=name, password='!', is_active=False)
+                for name in missing)
+            found.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+        return found
+
+    def groups(self, slugs):
+        slugs = set(slugs) - {None, ''}
+        found = dict(Group.objects.filter(
+            slug__in=slugs).values_list('slug', 'pk'))
+        missing = slugs - set(found)
+        if missing and self.create_missing:
+            Group.objects.bulk_create(
+                Group(title=slug, slug=slug, description='')
+                for slug in missing)
+            found.update(Group.objects.filter(
+                slug__in=missing).values_list('slug', 'pk'))
+        return found
+
+    def new_rows(self, model, rows, same):
+        """Drop rows imported before and give ids to the others.
+
+        ``same`` names the fields that tell a row from another one with
+        its id.
+        """
+        id_map = self.mapped(self.kind)
+        ids = {row['id'] for row in rows if row['id'] is not None}
+        stored = {
+            pk: tuple(values) for pk, *values in model.objects.filter(
+                pk__in=ids).values_list('pk', *same)}
+        seen = set()
+        new = []
+        for row in rows:
+            exported = row['id']
+            key = tuple(row[field] for field in same)
+            if (exported in seen or exported in id_map
+                    or stored.get(exported) == key):
+                continue
+            if exported in stored:
+                if self.id_map is None:
+                    raise ImportConflict(
+                        f'{self.kind} id {exported} is taken by another '
+                        f'row; import with an id map to renumber it')
+                row['id'] = None
+            if exported is not None:
+                seen.add(exported)
+            new.append((exported, row))
+        self.assign_ids(model, [row for _, row in new], ids)
+        for exported, row in new:
+            if exported is not None and exported != row['id']:
+                id_map[exported] = row['id']
+        return [row for _, row in new]
+
+    def assign_ids(self, model, rows, batch_ids):
+        """Number ``rows`` without an id past the stored and batch ids."""
+        if self.next_id is None:
+            self.next_id = (model.objects.aggregate(
+                last=Max('pk'))['last'] or 0) + 1
+        self.next_id = max(self.next_id, max(batch_ids, default=0) + 1)
+        for row in rows:
+            if row['id'] is None:
+                row['id'] = self.next_id
+                self.next_id += 1
+
+    def import_posts(self, batch):
+        users = self.users(row['author'] for row in batch)
+        groups = self.groups(row.get('group') for row in batch)
+        rows = []
+        for row in batch:
+            group = row.get('group') or None
+            if row['author'] in users and (
+                    group is None or group in groups):
+                rows.append({
+                    'id': _int(row.get('id')),
+                    'author_id': users[row['author']],
+                    'group_id': groups.get(group),
+                    'text': row['text'],
+                    'pub_date': _date(row.get('pub_date')),
+                    'image': row.get('image') or ''})
+        posts = [
+            Post(**row, trend_score=event_score('post', row['pub_date']))
+            for row in self.new_rows(Post, rows, ('author_id', 'pub_date'))]
+        bulk_create_dated(Post, posts, 'pub_date')
+
+        fan_out_posts(posts)
+        index_new_posts(posts)
+        for post in posts:
+            if post.image:
+                schedule_thumbnails(post)
+        self.count(batch, posts)
+
+    def import_comments(self, batch):
+        post_map = self.mapped('posts')
+        users = self.users(row['author'] for row in batch)
+        post_ids = {
+            post_map.get(_int(row.get('post')), _int(row.get('post')))
+            for row in batch}
+        posts = set(Post.objects.filter(pk__in=post_ids).values_list(
+            'pk', flat=True))
+        rows = []
+        for row in batch:
+            post_id = _int(row.get('post'))
+            post_id = post_map.get(post_id, post_id)
+            if row['author'] in users and post_id in posts:
+                rows.append({
+                    'id': _int(row.get('id')),
+                    'post_id': post_id,
+                    'author_id': users[row['author']],
+                    'text': row['text'],
+                    'created': _date(row.get('created'))})
+        comments = [
+            Comment(**row) for row in self.new_rows(
+                Comment, rows, ('post_id', 'author_id', 'created'))]
+        bulk_create_dated(Comment, comments, 'created')
+
+        scores = defaultdict(list)
+        for comment in comments:
+            scores[comment.post_id].append(
+                event_score('comment', comment.created))
+        post_ids = set(scores)
+        for post_id in post_ids:
+            reindex_comments(post_id)
+            record(post_id, scores[post_id])
+        invalidate_many(post_ids=post_ids)
+        self.count(batch, comments)
+
+    def import_follows(self, batch):
+        users = self.users(
+            name for row in batch for name in (row['user'], row['author']))
+        pairs = {
+            (users[row['user']], users[row['author']]) for row in batch
+            if row['user'] in users and row['author'] in users
+            and row['user'] != row['author']}
+        existing = set(Follow.objects.filter(
+            user_id__in={user for user, _ in pairs},
+            author_id__in={author for _, author in pairs},
+        ).values_list('user_id', 'author_id'))
+        pairs -= existing
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs),
+            ignore_conflicts=True)
+
+        backfill_feeds(pairs)
+        invalidate_many(user_ids={user for pair in pairs for user in pair})
+        self.count(batch, pairs)
+
+    def count(self, batch, imported):
+        self.imported += len(imported)
+        self.skipped += len(batch) - len(imported)
@@ -0,0 +1,84 @@
+"""Trending posts ranked by decaying engagement.
+
+Every engagement (publishing, a view, a comment) adds ``weight`` to the
+post's score, and the weight halves every ``trending_half_life`` hours.
+Instead of decaying all stored scores as time goes on, newer events are
+weighted up: an event at time ``t`` counts ``weight * 2 ** (t / half_life)``.
+The order of posts is the same, and a score only changes when its own post
+is engaged with, so it is maintained with one ``UPDATE`` per comment (views
+are batched by ``posts.viewcounts``) and ``-trend_score`` indexes make the
+top ``K`` a ``K``-row index scan.
+
+The sum grows exponentially, so ``trend_score`` stores its base-2
+logarithm and events are added with ``log_add``.
+"""
+import math
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .constants import trending_amount, trending_half_life, trending_weights
+from .models import Post
+
+EPOCH = timezone.datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def event_score(kind, when=None):
+    """Return the log2 contribution of one ``kind`` event at ``when``."""
+    when = when or timezone.now()
+    hours = (when - EPOCH).total_seconds() / 3600
+    return math.log2(trending_weights[kind]) + hours / trending_half_life
+
+
+def log_add(a, b):
+    """Return ``log2(2 ** a + 2 ** b)`` without leaving log space."""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def log_sub(a, b):
+    """Return ``log2(2 ** a - 2 ** b)``, or ``None`` if ``b`` is not less."""
+    if b >= a:
+        return None
+    return a + math.log2(1 - 2 ** (b - a))
+
+
+def initial_score(post):
+    return event_score('post', post.pub_date)
+
+
+def record(post_id, scores, remove=False):
+    """Add (or with ``remove`` take away) event ``scores`` of a post.
+
+    A post never drops below the score of its own publication, which also
+    absorbs the rounding of repeated subtractions.
+    """
+    using = router.db_for_write(Post)
+    with transaction.atomic(using=using):
+        row = Post.objects.using(using).select_for_update().filter(
+            pk=post_id).values_list('trend_score', 'pub_date').first()
+        if row is None:
+            return
+        score, pub_date = row
+        floor = event_score('post', pub_date)
+        for value in scores:
+            if remove:
+                score = log_sub(score, value)
+                if score is None or score < floor:
+                    score = floor
+            else:
+                score = log_add(score, value)
+        Post.objects.using(using).filter(pk=post_id).update(
+            trend_score=score)
+
+
+def record_comment(comment, remove=False):
+    record(comment.post_id, [event_score('comment', comment.created)],
+           remove)
+
+
+def trending_posts(posts=None, amount=trending_amount):
+    """Return the ``amount`` top scored ``posts`` (all posts by default)."""
+    if posts is None:
+        posts = Post.objects.all()
+    return posts.order_by('-trend_score', '-pk')[:amount]
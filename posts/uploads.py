@@ -0,0 +1,67 @@
+"""Streaming handling and normalization of uploaded post images."""
+from hashlib import sha256
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+from .constants import image_max_side, image_max_upload_size, image_quality
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploads to a temporary file and stops writing at the limit.
+
+    Bytes past ``image_max_upload_size`` are dropped as they arrive, and
+    the resulting file is flagged with ``too_large`` for the form to
+    reject, so oversized uploads cost neither memory nor disk.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.written = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.written + len(raw_data) > image_max_upload_size:
+            self.too_large = True
+            return None
+        self.written += len(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(self.written)
+        upload.too_large = self.too_large
+        return upload
+
+
+def normalize_image(upload, field):
+    """Re-encode an uploaded image for storage under ``field``.
+
+    The image is turned upright, scaled down to ``image_max_side`` and
+    saved without EXIF as JPEG, or as PNG when it has transparency. The
+    file is named after the hash of its content: when that file is already
+    stored, its name is returned instead of new content.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image.draft('RGB', (image_max_side, image_max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((image_max_side, image_max_side), Image.LANCZOS)
+        output = BytesIO()
+        if image.mode in ('RGBA', 'LA', 'PA') or (
+                image.mode == 'P' and 'transparency' in image.info):
+            image.save(output, 'PNG', optimize=True)
+            extension = 'png'
+        else:
+            image.convert('RGB').save(
+                output, 'JPEG', quality=image_quality, optimize=True,
+                progressive=True)
+            extension = 'jpg'
+
+    content = output.getvalue()
+    name = f'{sha256(content).hexdigest()}.{extension}'
+    path = field.generate_filename(None, name)
+    if field.storage.exists(path):
+        return path
+    return ContentFile(content, name=name)
@@ -7,14 +7,24 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_post, name='group'),
+    path('group/<slug:slug>/trending/', views.group_trending,
+         name='group_trending'),
+    path('trending/', views.trending, name='trending'),
     path('new/', views.new_post, name='new_post'),
+    path('search/', views.search, name='search'),
+    path('stats/', views.stats, name='stats'),
+    path('stats/templates/', views.template_stats, name='template_stats'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path('<str:username>/<int:post_id>/edit/', views.post_edit,
          name='post_edit'),
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='comments'),
     path('<username>/<int:post_id>/comment', views.add_comment,
          name='add_comment'),
     path('follow/',
          views.follow_index, name='follow_index'),
+    path('follow/events/',
+         views.follow_events, name='follow_events'),
     path('<str:username>/follow/',
          views.profile_follow, name='profile_follow'),
     path('<str:username>/unfollow/',
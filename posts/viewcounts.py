@@ -0,0 +1,158 @@
+"""Buffered post view counts.
+
+Counting a view with its own ``UPDATE`` would make every post page a
+write, and SQLite serializes writers. Instead ``view_counter`` adds views
+to a per-process buffer and writes them all at once. Servers turn on its
+flusher thread (``yatube.wsgi`` and the ASGI lifespan), which flushes
+every ``VIEW_COUNTS_INTERVAL`` seconds and as soon as
+``VIEW_COUNTS_BATCH`` views are pending, so no request waits for the
+write. The thread is started by the first ``add`` of each process, so
+workers forked after the application is loaded, as with ``gunicorn
+--preload``, get their own. Other processes, such as the shell and
+tests, flush in the ``add`` call that finds the buffer due. A flush is
+one ``SELECT`` of the trending scores and one ``UPDATE`` with ``CASE``
+per ``flush_chunk`` posts, however many views they got.
+
+Views leave the buffer only once they are written: a failed flush keeps
+them for the next one, which the thread tries after the interval.
+Pending views are flushed when the server process exits normally. A
+process that is killed loses what it has not flushed: at most about
+``VIEW_COUNTS_BATCH`` views, taken in at most ``VIEW_COUNTS_INTERVAL``
+seconds, while writes succeed.
+
+Post pages show the stored count, which lags by the views still buffered
+in any process; it is part of their ETag, so a revalidated page changes
+when a flush has counted its views.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import (DatabaseError, close_old_connections, router,
+                       transaction)
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+
+from .models import Post
+from .trending import event_score, log_add
+
+logger = logging.getLogger(__name__)
+
+flush_chunk = 100
+
+
+class ViewCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.views = Counter()
+        self.flushed_at = time.monotonic()
+        self.failed = False
+        self.wake = threading.Event()
+        self.threaded = False
+        self.thread = None
+        self.pid = None
+
+    def add(self, post_id):
+        with self.lock:
+            self.views[post_id] += 1
+            full = (sum(self.views.values())
+                    >= getattr(settings, 'VIEW_COUNTS_BATCH', 200))
+            due = full or (time.monotonic() - self.flushed_at
+                           >= getattr(settings, 'VIEW_COUNTS_INTERVAL', 10))
+        if not self.threaded:
+            if due:
+                self.flush()
+            return
+        self.start_thread()
+        if full and not self.failed:
+            self.wake.set()
+
+    def pending(self, post_id):
+        with self.lock:
+            return self.views[post_id]
+
+    def start(self):
+        """Flush in a daemon thread instead of in ``add`` from now on."""
+        self.threaded = True
+
+    def start_thread(self):
+        """Start the flusher of this process unless it is running."""
+        pid = os.getpid()
+        with self.lock:
+            if self.pid == pid and self.thread.is_alive():
+                return
+            self.pid = pid
+            self.thread = threading.Thread(
+                target=self.run, name='view-counts', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wake.wait(getattr(settings, 'VIEW_COUNTS_INTERVAL', 10))
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing post views failed')
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write the buffered views and return how many were written.
+
+        Views of the chunk that failed and of the chunks after it stay in
+        the buffer, with those added meanwhile.
+        """
+        with self.flush_lock:
+            with self.lock:
+                views = Counter(self.views)
+                self.flushed_at = time.monotonic()
+            written = Counter()
+            post_ids = sorted(views)
+            self.failed = False
+            try:
+                for start in range(0, len(post_ids), flush_chunk):
+                    chunk = {pk: views[pk]
+                             for pk in post_ids[start:start + flush_chunk]}
+                    write_views(chunk)
+                    written.update(chunk)
+            except DatabaseError:
+                logger.exception('Flushing post views failed')
+                self.failed = True
+            finally:
+                with self.lock:
+                    self.views.subtract(written)
+                    self.views = +self.views
+            return sum(written.values())
+
+
+def write_views(views):
+    """Add ``{post_id: views}`` to view counts and trending scores."""
+    using = router.db_for_write(Post)
+    posts = Post.objects.using(using)
+    viewed = event_score('view')
+    with transaction.atomic(using=using):
+        scores = dict(posts.select_for_update().filter(
+            pk__in=views).order_by().values_list('pk', 'trend_score'))
+        if not scores:
+            return
+        posts.filter(pk__in=scores).update(
+            view_count=F('view_count') + Case(
+                *(When(pk=pk, then=Value(views[pk])) for pk in scores),
+                output_field=IntegerField()),
+            trend_score=Case(
+                *(When(pk=pk, then=Value(
+                    log_add(score, viewed + math.log2(views[pk]))))
+                  for pk, score in scores.items()),
+                output_field=FloatField()))
+
+
+view_counter = ViewCounter()
+
+
+def count_post_view(username, post_id):
+    view_counter.add(post_id)
@@ -1,20 +1,31 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
-from .constants import page_amount
+from .conditional import (conditional, group_metadata, post_metadata,
+                          post_page_metadata, profile_metadata)
+from .constants import comments_page_amount, page_amount
+from .events import backlog, post_event
+from .feed import FeedPaginator
 from .forms import CommentForm, PostForm
+from .instrumentation import template_profile, view_stats
 from .models import Follow, Group, Post
+from .paginator import CommentPaginator, CursorPaginator
+from .search import find_posts
+from .thumbnails import schedule_thumbnails
+from .trending import trending_posts
+from .viewcounts import count_post_view
 
 User = get_user_model()
 
 
 def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, page_amount)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    latest = Post.objects.for_feed()
+    paginator = CursorPaginator(latest, page_amount)
+    page = paginator.get_page(request.GET.get('cursor'))
     return render(
         request,
         'index.html',
@@ -22,12 +33,12 @@ def index(request):
     )
 
 
+@conditional(group_metadata)
 def group_post(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, page_amount)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = group.posts.for_feed()
+    paginator = CursorPaginator(posts, page_amount)
+    page = paginator.get_page(request.GET.get('cursor'))
     return render(
         request,
         'group.html',
@@ -35,6 +46,24 @@ def group_post(request, slug):
     )
 
 
+def trending(request):
+    return render(
+        request,
+        'trending.html',
+        {'posts': trending_posts(Post.objects.for_feed()), }
+    )
+
+
+def group_trending(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return render(
+        request,
+        'trending.html',
+        {'posts': trending_posts(group.posts.for_feed()),
+         'group': group, }
+    )
+
+
 @login_required
 def new_post(request):
     is_new = True
@@ -47,16 +76,18 @@ def new_post(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    if post.image:
+        schedule_thumbnails(post)
     return redirect('posts:index')
 
 
+@conditional(profile_metadata)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts_all = author.posts.all()
+    posts_all = author.posts.for_feed()
     following = Follow.objects.filter(author=author)
-    paginator = Paginator(posts_all, page_amount)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts_all, page_amount)
+    page = paginator.get_page(request.GET.get('cursor'))
     return render(
         request,
         'profile.html',
@@ -67,10 +98,13 @@ def profile(request, username):
     )
 
 
+@conditional(post_page_metadata, viewed=count_post_view)
 def post_view(request, username, post_id):
     post = get_object_or_404(Post, pk=post_id)
     author = get_object_or_404(User, username=username)
-    comments = post.comments.all()
+    paginator = CommentPaginator(
+        post.comments.select_related('author'), comments_page_amount)
+    comment_page = paginator.get_page(request.GET.get('cursor'))
     comments_show = True
     form = CommentForm()
     return render(
@@ -78,11 +112,39 @@ def post_view(request, username, post_id):
         'post.html',
         {'post': post,
          'author': author,
-         'comments': comments,
+         'comments': paginator.page_rows(comment_page),
+         'comment_page': comment_page,
          'form': form,
          'comments_show': comments_show, })
 
 
+@conditional(post_metadata)
+def post_comments(request, username, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    author = get_object_or_404(User, username=username)
+    paginator = CommentPaginator(
+        post.comments.select_related('author'), comments_page_amount)
+    comment_page = paginator.get_page(request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {'id': comment.pk,
+                 'author': comment.author.username,
+                 'author_name': comment.author.get_full_name(),
+                 'text': comment.text,
+                 'created': comment.created.isoformat(), }
+                for comment in comment_page],
+            'next_cursor': comment_page.next_cursor,
+        })
+    return render(
+        request,
+        'include/comment_list.html',
+        {'post': post,
+         'author': author,
+         'comments': paginator.page_rows(comment_page),
+         'comment_page': comment_page, })
+
+
 @login_required
 def post_edit(request, username, post_id):
     is_edit = True
@@ -105,9 +167,32 @@ def post_edit(request, username, post_id):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    if 'image' in form.changed_data:
+        schedule_thumbnails(post)
     return redirect('posts:post', username, post_id)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(find_posts(query), page_amount)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(
+        request,
+        'search.html',
+        {'page': page, 'query': query, }
+    )
+
+
+@staff_member_required
+def stats(request):
+    return JsonResponse(view_stats.snapshot())
+
+
+@staff_member_required
+def template_stats(request):
+    return JsonResponse(template_profile.snapshot())
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -141,20 +226,36 @@ def add_comment(request, username, post_id):
 @login_required
 def follow_index(request):
     author_list = Follow.objects.filter(user=request.user)
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, page_amount)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = FeedPaginator(request.user, page_amount)
+    page = paginator.get_page(request.GET.get('cursor'))
+    # new posts are counted from the newest one of the feed, not the page
+    newest = page if not page.has_previous() else FeedPaginator(
+        request.user, 1).get_page(None)
     return render(
         request,
         'follow.html',
         {'page': page,
          'paginator': paginator,
-         'post': post_list,
-         'author': author_list, }
+         'author': author_list,
+         'last_id': newest[0].pk if newest else 0, }
     )
 
 
+@login_required
+def follow_events(request):
+    """Missed posts of followed authors, as server-sent events.
+
+    The ASGI application streams this URL with ``posts.events``; this is
+    what WSGI servers answer, and the long ``retry`` makes it a poll.
+    """
+    events, _ = backlog(request.user, request)
+    body = b'retry: 30000\n\n' + b''.join(
+        post_event(number, summary) for number, summary in events)
+    response = HttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -123,13 +123,13 @@ class TestFollow:
         assert 'paginator' in response.context, (
             'Проверьте, что передали переменную `paginator` в контекст страницы `/follow/`'
         )
-        assert type(response.context['paginator']) == Paginator, (
+        assert isinstance(response.context['paginator'], Paginator), (
             'Проверьте, что переменная `paginator` на странице `/follow/` типа `Paginator`'
         )
         assert 'page' in response.context, (
             'Проверьте, что передали переменную `page` в контекст страницы `/follow/`'
         )
-        assert type(response.context['page']) == Page, (
+        assert isinstance(response.context['page'], Page), (
             'Проверьте, что переменная `page` на странице `/follow/` типа `Page`'
         )
         assert len(response.context['page']) == 2, (
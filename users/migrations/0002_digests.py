@@ -0,0 +1,23 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='email_digests',
+            field=models.BooleanField(default=True, verbose_name='Присылать дайджесты уведомлений'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='last_digest',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import models
+
+User = get_user_model()
+
+
+class Profile(models.Model):
+    """Stored per-user counters, kept in step by ``posts.signals``, and
+    email digest settings of ``posts.notifications``."""
+    UNSUBSCRIBE_SALT = 'users.unsubscribe'
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile', )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    email_digests = models.BooleanField(
+        'Присылать дайджесты уведомлений', default=True)
+    last_digest = models.DateTimeField(blank=True, null=True, editable=False)
+
+    def __str__(self):
+        return f'{self.user}'
+
+    @property
+    def unsubscribe_token(self):
+        return signing.dumps(self.user_id, salt=self.UNSUBSCRIBE_SALT)
+
+    @classmethod
+    def by_unsubscribe_token(cls, token):
+        """Return the profile a token was made for, ``None`` if forged."""
+        try:
+            user_id = signing.loads(token, salt=cls.UNSUBSCRIBE_SALT)
+        except signing.BadSignature:
+            return None
+        return cls.objects.filter(user_id=user_id).first()
@@ -4,4 +4,5 @@ from . import views
 
 urlpatterns = [
     path('signup/', views.SignUp.as_view(), name='signup'),
+    path('unsubscribe/<str:token>/', views.unsubscribe, name='unsubscribe'),
 ]
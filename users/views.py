@@ -1,10 +1,30 @@
+from django.http import Http404
+from django.shortcuts import render
 from django.urls import reverse_lazy
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import CreateView
 
 from .forms import CreationForm
+from .models import Profile
 
 
 class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('signup')
     template_name = 'signup.html'
+
+
+@csrf_exempt
+def unsubscribe(request, token):
+    """Turn email digests off, or back on, from the link in a digest.
+
+    The signed token stands in for a login and a CSRF token, so mail
+    clients can unsubscribe with one POST (``List-Unsubscribe-Post``).
+    """
+    profile = Profile.by_unsubscribe_token(token)
+    if profile is None:
+        raise Http404
+    if request.method == 'POST':
+        profile.email_digests = 'subscribe' in request.POST
+        profile.save(update_fields=('email_digests',))
+    return render(request, 'unsubscribe.html', {'profile': profile})
@@ -0,0 +1,199 @@
+"""ASGI entry point.
+
+Django 2.2 has neither an ASGI handler nor async views, so ``AsgiHandler``
+adapts the WSGI application to ASGI 3: the event loop holds the
+connections, reads request bodies and writes responses, and each request
+runs in a bounded thread pool, which also bounds the database connections
+a worker opens. Views in ``ASGI_SLOW_VIEWS`` - the follow feed and comment
+pages, whose queries are the slowest - run in a pool of their own with
+``ASGI_SLOW_THREADS`` threads, so however many of them are waiting, the
+other ``ASGI_THREADS`` keep serving every other page. Views named in
+``ASGI_STREAMS`` are served by coroutines instead, such as the event
+stream of ``posts.events``, which waits on the loop without a thread.
+
+Django ends a request in ``response.close()``, whose ``request_finished``
+receivers act on the state of the calling thread, such as its database
+connection. So a response is read and closed in the thread job that made
+it, and only streaming responses are sent chunk by chunk, each chunk
+read in any free thread, and closed in one.
+
+Run it with any ASGI server, e.g. ``uvicorn yatube.asgi:application``.
+"""
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.urls import Resolver404, resolve
+from django.utils.module_loading import import_string
+
+# Request bodies larger than this are spooled to disk
+BODY_MEMORY_SIZE = 1024 * 1024
+
+
+class AsgiHandler:
+    def __init__(self, wsgi_application, threads=None, slow_threads=None):
+        self.wsgi_application = wsgi_application
+        self.slow_views = set(getattr(settings, 'ASGI_SLOW_VIEWS', ()))
+        self.streams = {
+            view_name: import_string(path) for view_name, path
+            in getattr(settings, 'ASGI_STREAMS', {}).items()}
+        self.executor = ThreadPoolExecutor(
+            threads or getattr(settings, 'ASGI_THREADS', 8),
+            thread_name_prefix='asgi')
+        slow_threads = (slow_threads if slow_threads is not None
+                        else getattr(settings, 'ASGI_SLOW_THREADS', 4))
+        self.slow_executor = ThreadPoolExecutor(
+            slow_threads, thread_name_prefix='asgi-slow'
+        ) if slow_threads else self.executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope {scope["type"]}')
+        body = await self.read_body(receive)
+        view_name = self.view_name(scope['path'])
+        if view_name in self.streams:
+            try:
+                await self.streams[view_name](
+                    scope, receive, send, self.environ(scope, body),
+                    self.run_sync)
+            finally:
+                body.close()
+            return
+        executor = (self.slow_executor if view_name in self.slow_views
+                    else self.executor)
+        loop = asyncio.get_running_loop()
+        try:
+            start, response = await loop.run_in_executor(
+                executor, self.run_wsgi, self.environ(scope, body))
+            try:
+                await self.send_response(start, response, send, executor)
+            finally:
+                if hasattr(response, 'close'):
+                    await loop.run_in_executor(executor, response.close)
+        finally:
+            body.close()
+
+    async def send_response(self, start, response, send, executor):
+        """Send the response, iterating a stream in ``executor``.
+
+        A streaming response never holds a thread between its chunks.
+        """
+        loop = asyncio.get_running_loop()
+        status, headers = start
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in headers],
+        })
+        if isinstance(response, bytes):
+            await send({'type': 'http.response.body', 'body': response})
+            return
+        chunks = iter(response)
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body',
+                            'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def lifespan(self, receive, send):
+        from posts.viewcounts import view_counter
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                view_counter.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, view_counter.flush)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def view_name(self, path):
+        try:
+            return resolve(path).view_name
+        except Resolver404:
+            return None
+
+    async def run_sync(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args)
+
+    async def read_body(self, receive):
+        body = SpooledTemporaryFile(max_size=BODY_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    def environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode().decode('latin1'),
+            'QUERY_STRING': scope['query_string'].decode('ascii'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin1').upper().replace('-', '_')
+            value = value.decode('latin1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f'HTTP_{name}'
+            if name in environ:
+                value = f'{environ[name]},{value}'
+            environ[name] = value
+        return environ
+
+    def run_wsgi(self, environ):
+        """Call the WSGI application and return its start and response.
+
+        The body of a response that does not stream is read and the
+        response closed here, on the thread that made it, and the body is
+        returned as ``bytes``. The caller closes a streaming response when
+        it is sent or sending fails.
+        """
+        start = []
+
+        def start_response(status, headers, exc_info=None):
+            start[:] = [status, headers]
+
+        response = self.wsgi_application(environ, start_response)
+        if getattr(response, 'streaming', False):
+            return start, response
+        try:
+            return start, b''.join(response)
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = AsgiHandler(get_wsgi_application())
@@ -1,11 +1,13 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 SECRET_KEY = '76c%xk_y=rhqefh6&0$d)!*!@g0-%(9-s#!dn+!393ybb85g#b'
 
-DEBUG = True
+# YATUBE_DEBUG=0 runs the production profile, with cached templates
+DEBUG = os.environ.get('YATUBE_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -28,6 +30,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.instrumentation.InstrumentationMiddleware',
+    'posts.replicas.ReplicaMiddleware',
+    'posts.tasks.BackgroundTasksMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,15 +42,26 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# API requests failing the CSRF check get a JSON error (see posts.api)
+CSRF_FAILURE_VIEW = 'posts.api.csrf_failure'
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    # compile each template once per process instead of on every render
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'posts.instrumentation.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -58,23 +74,133 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
+
+# Under ASGI every request runs in a pool of ASGI_THREADS threads, except
+# the views in ASGI_SLOW_VIEWS, which get ASGI_SLOW_THREADS of their own
+ASGI_THREADS = 8
+ASGI_SLOW_THREADS = 4
+ASGI_SLOW_VIEWS = (
+    'posts:follow_index',
+    'posts:comments',
+    'api:follow_index',
+    'api:comments',
+)
+# Views the ASGI application serves itself with a coroutine, which
+# takes no thread while waiting
+ASGI_STREAMS = {
+    'posts:follow_events': 'posts.events.follow_stream',
+}
+# Seconds between comments keeping idle event streams open
+EVENTS_KEEPALIVE = 15
 
 
 # Database
 
+# yatube.sqlite is the stock SQLite backend with WAL, busy_timeout and
+# other PRAGMAs set on every connection; see yatube/sqlite/base.py.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Read replicas
+
+# YATUBE_REPLICAS lists comma-separated SQLite files that hold copies of
+# the default database; "manage.py sync_replicas" refreshes them. GET
+# requests to REPLICA_VIEWS read from a random replica unless the client
+# wrote less than REPLICA_PIN_SECONDS ago.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('YATUBE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'yatube.sqlite',
+        'NAME': path,
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+
+REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group',
+    'posts:group_trending',
+    'posts:trending',
+    'posts:profile',
+    'posts:post',
+    'posts:follow_index',
+    'api:index',
+    'api:group',
+    'api:group_trending',
+    'api:trending',
+    'api:profile',
+    'api:post',
+    'api:follow_index',
+)
+REPLICA_PIN_SECONDS = 10
+
+# Cache
+
+# Every worker has to see the same cache, otherwise invalidation of feeds
+# and fragments only reaches the process that made the write. YATUBE_CACHE
+# picks the backend: "file" (the default) needs no extra services,
+# "memcached" reads its address from YATUBE_CACHE_LOCATION and needs
+# python-memcached. Test runs default to "locmem", so they neither read
+# nor clear the cache of the development server. "db" makes every
+# fragment read and write an SQL query on the primary, so pages cost a
+# query per post card again; it needs "manage.py createcachetable".
+# "locmem" is per-process and only suitable for a single worker. The Timed* backends add their calls to the Server-Timing
+# header.
+CACHE_BACKENDS = {
+    'db': {
+        'BACKEND': 'posts.instrumentation.TimedDatabaseCache',
+        'LOCATION': 'yatube_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'file': {
+        'BACKEND': 'posts.instrumentation.TimedFileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'memcached': {
+        'BACKEND': 'posts.instrumentation.TimedMemcachedCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', '127.0.0.1:11211'),
+    },
+    'locmem': {
+        'BACKEND': 'posts.instrumentation.TimedLocMemCache',
+    },
+}
+
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_BACKENDS[os.environ.get(
+            'YATUBE_CACHE', 'locmem' if TESTING else 'file')],
+        'KEY_PREFIX': 'yatube',
     }
 }
 
+# Instrumentation
+
+# Queries slower than this many milliseconds are logged with their view
+SLOW_QUERY_MS = 100
+# Minutes of per-view timings kept for the staff stats page
+INSTRUMENTATION_WINDOW = 15
+# Time every template and include for the staff template stats page
+TEMPLATE_PROFILING = os.environ.get('YATUBE_TEMPLATE_PROFILING') == '1'
+
+# Post views are buffered per process and written by a thread when this
+# many are pending or every this many seconds (see posts.viewcounts)
+VIEW_COUNTS_BATCH = 200
+VIEW_COUNTS_INTERVAL = 10
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -113,6 +239,27 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static'), ]
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'posts.uploads.LimitedTemporaryFileUploadHandler',
+]
+
+# Tasks
+
+# Feed delivery, post indexing and thumbnails are queued as posts.tasks
+# and run by "manage.py run_tasks". YATUBE_TASKS_EAGER=1, the default
+# with DEBUG, runs them in the request instead, apart from thumbnails,
+# which are made once the response has been sent.
+TASKS_EAGER = os.environ.get(
+    'YATUBE_TASKS_EAGER', '1' if DEBUG else '0') == '1'
+# Tasks a worker claims at once, seconds it sleeps when none are due,
+# seconds before another worker may take over its claims, and seconds
+# before the first retry of a failed task (doubled for each next one)
+TASKS_BATCH = 100
+TASKS_POLL = 1
+TASKS_LEASE = 300
+TASKS_RETRY_DELAY = 10
 # Login
 
 LOGIN_URL = '/auth/login/'
@@ -122,3 +269,14 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+# New comments and followers are mailed as digests by "manage.py
+# send_digests", run from cron: at most one digest per user every
+# DIGEST_INTERVAL seconds, listing DIGEST_MAX_ITEMS notifications, sent
+# DIGEST_BATCH per email connection and at most DIGESTS_PER_RUN per run
+DIGEST_INTERVAL = 6 * 60 * 60
+DIGEST_MAX_ITEMS = 20
+DIGEST_BATCH = 100
+DIGESTS_PER_RUN = 5000
+# Address of the site in links sent by email
+SITE_URL = os.environ.get('YATUBE_SITE_URL', 'http://127.0.0.1:8000')
@@ -0,0 +1,52 @@
+"""SQLite backend tuned for several concurrent worker processes.
+
+Every new connection gets ``PRAGMAS`` (overridable per database through
+``OPTIONS['pragmas']``): WAL lets readers run while a write is in
+progress, ``synchronous = NORMAL`` is durable enough under WAL, and
+``busy_timeout`` makes a writer wait for the lock instead of failing with
+"database is locked". Transactions begin with ``BEGIN IMMEDIATE`` so that
+a transaction which reads before writing waits for the lock up front
+rather than failing when it upgrades. With ``CONN_MAX_AGE`` connections
+are reused across requests and checked with a ping before each reuse.
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.transaction_mode = params.pop('transaction_mode', 'IMMEDIATE')
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        if (self.connection is not None and not self.in_atomic_block
+                and not self.is_usable()):
+            self.close()
+            return
+        super().close_if_unusable_or_obsolete()